@@ -0,0 +1,256 @@
+import os
+import mmap
+import struct
+import hashlib
+import argparse
+from collections import namedtuple
+from pcm import find_audio_files, SAMPLE_DTYPES
+
+# Packed sound bank for the game runtime.
+#
+# Layout, all integers little endian:
+#   header      HEADER, at offset 0
+#   entries     entry_count ENTRY records, sorted by name. Each is 80 bytes
+#               with every field naturally aligned, so a runtime can read the
+#               mapped index as an array of structs.
+#   names       UTF-8 string table referenced by the entries
+#   sample data one block per entry, each starting on an `alignment` boundary
+#
+# Sample data is uncompressed interleaved PCM (codec 0), so the runtime can map
+# the file and hand each entry's bytes to the mixer without copying. Loop
+# points are frame offsets at the entry's frame rate, with loop_end 0 meaning
+# the sound does not loop; points given at the source file's rate are scaled
+# when the bank is resampled. Every entry stores a hash of its source file,
+# encode settings and loop points; rebuilding
+# a bank copies the data of unchanged entries out of the previous build
+# instead of decoding and converting the source again.
+
+MAGIC = b"ABNK"
+VERSION = 2
+CODEC_PCM = 0
+DEFAULT_ALIGNMENT = 64
+HEADER = struct.Struct("<4sHHIIQQQ")
+# data_offset, data_length, frames, loop_start, loop_end, frame_rate, name_offset,
+# name_length, channels, sample_width, codec, content_hash, padding
+ENTRY = struct.Struct("<QQQQQIIHHHH20s4x")
+HASH_BLOCK_BYTES = 1 << 20
+
+BankEntry = namedtuple("BankEntry", ["name", "frame_rate", "channels", "sample_width", "codec",
+                                     "data_offset", "data_length", "frames", "loop_start", "loop_end", "content_hash"])
+
+
+def content_hash(file_path, frame_rate, channels, sample_width, loop_start=0, loop_end=0):
+    digest = hashlib.sha1(f"{frame_rate}:{channels}:{sample_width}:{loop_start}:{loop_end}:".encode("ascii"))
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b""):
+            digest.update(block)
+    return digest.digest()
+
+
+def encode_asset(file_path, frame_rate=None, channels=None, sample_width=2):
+    from cache import decode_file
+    segment = decode_file(file_path)
+    source_rate = segment.frame_rate
+    if frame_rate:
+        segment = segment.set_frame_rate(frame_rate)
+    if channels:
+        segment = segment.set_channels(channels)
+    if sample_width:
+        segment = segment.set_sample_width(sample_width)
+    return segment.raw_data, segment.frame_rate, segment.channels, segment.sample_width, source_rate
+
+
+class SoundBank:
+    def __init__(self, file_path):
+        self.file_path = file_path
+        with open(file_path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, flags, count, self.alignment, entries_offset, names_offset, data_offset = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.map.close()
+            raise ValueError(f"{file_path} is not a version {VERSION} sound bank")
+        self.entries = {}
+        for i in range(count):
+            (offset, length, frames, loop_start, loop_end, frame_rate, name_offset, name_length,
+             channels, sample_width, codec, digest) = ENTRY.unpack_from(self.map, entries_offset + i * ENTRY.size)
+            name = self.map[names_offset + name_offset:names_offset + name_offset + name_length].decode("utf-8")
+            self.entries[name] = BankEntry(name, frame_rate, channels, sample_width, codec, offset, length,
+                                           frames, loop_start, loop_end, digest)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def names(self):
+        return list(self.entries)
+
+    def entry(self, name):
+        return self.entries[name]
+
+    def raw(self, name):
+        # A memoryview onto the mapped file; no sample data is copied.
+        entry = self.entries[name]
+        return memoryview(self.map)[entry.data_offset:entry.data_offset + entry.data_length]
+
+    def samples(self, name):
+        # Integer samples shaped (frames, channels), as a view onto the mapped file.
+        import numpy as np
+        entry = self.entries[name]
+        samples = np.frombuffer(self.map, dtype=SAMPLE_DTYPES[entry.sample_width],
+                                count=entry.data_length // entry.sample_width, offset=entry.data_offset)
+        return samples.reshape(-1, entry.channels)
+
+    def segment(self, name):
+        from pydub import AudioSegment
+        entry = self.entries[name]
+        return AudioSegment(data=bytes(self.raw(name)), sample_width=entry.sample_width,
+                            frame_rate=entry.frame_rate, channels=entry.channels)
+
+    def close(self):
+        try:
+            self.map.close()
+        except BufferError:
+            # Views from raw() or samples() are still alive; the map is released with them.
+            pass
+
+
+def asset_name(file_path, root=None):
+    name = os.path.relpath(file_path, root) if root else os.path.basename(file_path)
+    return os.path.splitext(name)[0].replace(os.sep, "/")
+
+
+def build_bank(output_path, assets, frame_rate=None, channels=None, sample_width=2, alignment=DEFAULT_ALIGNMENT):
+    # assets is a list of dicts with "path" and optionally "name", "loop_start"
+    # and "loop_end", in frames of the source file. Returns (names re-encoded, names reused from the old bank).
+    previous = None
+    if os.path.exists(output_path):
+        try:
+            previous = SoundBank(output_path)
+        except (ValueError, struct.error):
+            previous = None
+
+    assets = sorted(({"name": asset_name(asset["path"]), **asset} for asset in assets), key=lambda asset: asset["name"])
+    names = [asset["name"] for asset in assets]
+    if len(set(names)) != len(names):
+        raise ValueError("Sound bank asset names must be unique")
+
+    encoded, reused = [], []
+    name_table = b""
+    name_offsets = []
+    for name in names:
+        name_offsets.append(len(name_table))
+        name_table += name.encode("utf-8")
+    entries_offset = HEADER.size
+    names_offset = entries_offset + ENTRY.size * len(assets)
+    data_offset = _align(names_offset + len(name_table), alignment)
+
+    temp_path = output_path + ".tmp"
+    records = []
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(b"\0" * data_offset)
+            for asset in assets:
+                digest = content_hash(asset["path"], frame_rate, channels, sample_width,
+                                      asset.get("loop_start") or 0, asset.get("loop_end") or 0)
+                old = previous.entries.get(asset["name"]) if previous else None
+                if old is not None and old.content_hash == digest:
+                    data, entry_format = previous.raw(asset["name"]), (old.frame_rate, old.channels, old.sample_width)
+                    frames, loop_start, loop_end = old.frames, old.loop_start, old.loop_end
+                    reused.append(asset["name"])
+                else:
+                    raw_data, *entry_format, source_rate = encode_asset(asset["path"], frame_rate, channels, sample_width)
+                    data = raw_data
+                    frames = len(data) // (entry_format[1] * entry_format[2])
+                    loop_start, loop_end = _loop_points(asset, frames, entry_format[0] / source_rate)
+                    encoded.append(asset["name"])
+                offset = _align(f.tell(), alignment)
+                f.write(b"\0" * (offset - f.tell()))
+                f.write(data)
+                records.append((entry_format, offset, len(data), frames, loop_start, loop_end, digest))
+                del data
+
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, VERSION, 0, len(assets), alignment, entries_offset, names_offset, data_offset))
+            for name, name_offset, (entry_format, offset, length, frames, loop_start, loop_end, digest) in zip(names, name_offsets, records):
+                frame_rate_out, channels_out, sample_width_out = entry_format
+                f.write(ENTRY.pack(offset, length, frames, loop_start, loop_end, frame_rate_out, name_offset,
+                                   len(name.encode("utf-8")), channels_out, sample_width_out, CODEC_PCM, digest))
+            f.write(name_table)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    finally:
+        if previous:
+            previous.close()
+    os.replace(temp_path, output_path)
+    return encoded, reused
+
+
+def _loop_points(asset, frames, scale=1.0):
+    # scale converts the asset's loop points from source frames to output frames.
+    loop_start = int(round((asset.get("loop_start", 0) or 0) * scale))
+    loop_end = min(int(round((asset.get("loop_end", 0) or 0) * scale)), frames)
+    if not loop_end:
+        return 0, 0
+    if not 0 <= loop_start < loop_end:
+        raise ValueError(f"{asset['name']}: loop start {loop_start} must be before loop end {loop_end} "
+                         f"within its {frames} frames")
+    return loop_start, loop_end
+
+
+def _align(offset, alignment):
+    return (offset + alignment - 1) // alignment * alignment
+
+
+def file_asset(file_path, root=None):
+    # Loop points are taken from the .loop.json file written by loops.py, if any.
+    from loops import read_loop_points
+    asset = {"name": asset_name(file_path, root), "path": file_path}
+    loop_points = read_loop_points(file_path)
+    if loop_points:
+        asset["loop_start"], asset["loop_end"] = loop_points
+    return asset
+
+
+def folder_assets(folder):
+    return [file_asset(path, folder) for path in find_audio_files(folder)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and inspect packed sound banks.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="pack every audio file in a folder into a bank")
+    build.add_argument("output")
+    build.add_argument("folder")
+    build.add_argument("--frame-rate", type=int, default=None)
+    build.add_argument("--channels", type=int, default=None)
+    build.add_argument("--sample-width", type=int, default=2, choices=[1, 2, 4])
+    build.add_argument("--alignment", type=int, default=DEFAULT_ALIGNMENT)
+    listing = commands.add_parser("list", help="list the entries of a bank")
+    listing.add_argument("bank")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        encoded, reused = build_bank(args.output, folder_assets(args.folder), args.frame_rate, args.channels,
+                                     args.sample_width, args.alignment)
+        print(f"{len(encoded)} asset(s) encoded, {len(reused)} reused from the previous build")
+    else:
+        with SoundBank(args.bank) as bank:
+            for name in bank.names():
+                entry = bank.entry(name)
+                loop = f" loop {entry.loop_start}-{entry.loop_end}" if entry.loop_end else ""
+                print(f"{name}: {entry.frames} frames, {entry.frame_rate} Hz, {entry.channels} ch, "
+                      f"{8 * entry.sample_width} bit at {entry.data_offset}{loop}")
+
+
+if __name__ == "__main__":
+    main()
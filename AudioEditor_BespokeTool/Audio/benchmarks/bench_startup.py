@@ -0,0 +1,43 @@
+import os
+import re
+import sys
+import time
+import statistics
+import subprocess
+
+# Measures time to first paint by launching main.py repeatedly with
+# --startup-benchmark, which prints the startup timings and exits once the
+# window has painted. Runs offscreen unless QT_QPA_PLATFORM is already set.
+
+RUNS = 5
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LINE = re.compile(r"^(.*?)\s+([0-9.]+) ms$")
+
+
+def launch():
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "main.py", "--startup-benchmark"], cwd=APP_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    wall = time.perf_counter() - start
+    timings = {}
+    for line in output.splitlines():
+        match = LINE.match(line.strip())
+        if match:
+            timings[match.group(1)] = float(match.group(2))
+    return wall, timings
+
+
+def main():
+    runs = [launch() for _ in range(RUNS)]
+    labels = list(runs[-1][1])
+    print(f"median of {RUNS} launches")
+    for label in labels:
+        values = [timings[label] for _, timings in runs if label in timings]
+        print(f"{label:<28} {statistics.median(values):8.1f} ms")
+    print(f"{'process wall time':<28} {statistics.median(wall for wall, _ in runs) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
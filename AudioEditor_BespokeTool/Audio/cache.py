@@ -0,0 +1,286 @@
+import os
+import hashlib
+import weakref
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from store import SampleStoreWriter, SampleStore
+
+# Decoded audio cache shared by the editor, the audio_files library and the mixer.
+#
+# Entries are keyed by absolute path plus the file's mtime and size (or, with
+# key_by_hash, a hash of its contents), so a file that changes on disk is
+# decoded again. The memory tier evicts least recently used segments once
+# memory_budget bytes are exceeded. The optional disk tier keeps decoded PCM
+# in sample stores under cache_dir so later opens skip ffmpeg entirely.
+
+DEFAULT_MEMORY_BUDGET = 512 * 1024 * 1024
+DISK_SUFFIX = ".samples"
+HASH_BLOCK_BYTES = 1 << 20
+
+
+def file_hash(file_path):
+    digest = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def decode_file(file_path):
+    from pydub import AudioSegment
+    return AudioSegment.from_file(file_path)
+
+
+def decode_to_cache(file_path, cache_dir=None, key_by_hash=False):
+    # Runs in worker processes. Decodes through a disk tier when one is set and
+    # returns plain values so the result pickles cheaply back to the parent.
+    if cache_dir:
+        segment = AudioCache(memory_budget=0, cache_dir=cache_dir, key_by_hash=key_by_hash).get(file_path)
+    else:
+        segment = decode_file(file_path)
+    return file_path, segment.raw_data, segment.frame_rate, segment.channels, segment.sample_width
+
+
+class AudioCache:
+    def __init__(self, memory_budget=DEFAULT_MEMORY_BUDGET, cache_dir=None, disk_budget=None, key_by_hash=False):
+        self.memory_budget = memory_budget
+        self.cache_dir = cache_dir
+        self.disk_budget = disk_budget
+        self.key_by_hash = key_by_hash
+        self.entries = OrderedDict()
+        self.keys_by_path = {}
+        self.memory_used = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, file_path):
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        if self.key_by_hash:
+            return file_path, file_hash(file_path)
+        return file_path, stat.st_mtime_ns, stat.st_size
+
+    def get(self, file_path, key=None):
+        # key, when the caller has just computed it, saves a second stat or hash.
+        key = key or self.key(file_path)
+        with self.lock:
+            segment = self.entries.get(key)
+            if segment is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return segment
+        segment = self._read_disk(key)
+        if segment is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            segment = decode_file(file_path)
+            self._write_disk(key, segment)
+        self._remember(key, segment)
+        return segment
+
+    def lookup(self, key):
+        # The segment cached under key in either tier, without touching the source file.
+        with self.lock:
+            segment = self.entries.get(key)
+            if segment is not None:
+                self.entries.move_to_end(key)
+                return segment
+        return self._read_disk(key)
+
+    def put(self, file_path, segment):
+        # Adds a segment decoded elsewhere, e.g. in a worker process.
+        key = self.key(file_path)
+        if self.cache_dir and not os.path.exists(self._disk_path(key)):
+            self._write_disk(key, segment)
+        self._remember(key, segment)
+
+    def contains(self, file_path, include_disk=True):
+        try:
+            key = self.key(file_path)
+        except OSError:
+            return False
+        with self.lock:
+            if key in self.entries:
+                return True
+        return include_disk and bool(self.cache_dir) and os.path.exists(self._disk_path(key))
+
+    def invalidate(self, file_path):
+        with self.lock:
+            key = self.keys_by_path.pop(os.path.abspath(file_path), None)
+            if key in self.entries:
+                self.memory_used -= len(self.entries.pop(key).raw_data)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.keys_by_path.clear()
+            self.memory_used = 0
+
+    def _remember(self, key, segment):
+        size = len(segment.raw_data)
+        with self.lock:
+            old_key = self.keys_by_path.get(key[0])
+            if old_key is not None and old_key in self.entries:
+                self.memory_used -= len(self.entries.pop(old_key).raw_data)
+            if size > self.memory_budget:
+                self.keys_by_path.pop(key[0], None)
+                return
+            self.entries[key] = segment
+            self.keys_by_path[key[0]] = key
+            self.memory_used += size
+            while self.memory_used > self.memory_budget:
+                old_key, old_segment = self.entries.popitem(last=False)
+                self.memory_used -= len(old_segment.raw_data)
+                if self.keys_by_path.get(old_key[0]) == old_key:
+                    del self.keys_by_path[old_key[0]]
+
+    def _disk_path(self, key):
+        name = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, name + DISK_SUFFIX)
+
+    def _read_disk(self, key):
+        if not self.cache_dir:
+            return None
+        disk_path = self._disk_path(key)
+        try:
+            with SampleStore(disk_path) as store:
+                segment = store.read_segment("pcm")
+            os.utime(disk_path)
+            return segment
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write_disk(self, key, segment):
+        if not self.cache_dir:
+            return
+        disk_path = self._disk_path(key)
+        temp_path = f"{disk_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with SampleStoreWriter(temp_path) as writer:
+                writer.add_segment("pcm", segment)
+            os.replace(temp_path, disk_path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        if self.disk_budget:
+            self._prune_disk()
+
+    def _prune_disk(self):
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(DISK_SUFFIX):
+                path = os.path.join(self.cache_dir, name)
+                stat = os.stat(path)
+                files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_budget:
+                break
+            os.remove(path)
+            total -= size
+
+
+class AudioLibrary(MutableMapping):
+    # The audio_files mapping of path to segment. Files added by path are read
+    # through the cache on access, so they are not all held in memory and are
+    # decoded again if they change on disk. The library only holds weak
+    # references to what it has read, so an unchanged file still in memory is
+    # returned without going back to the cache. When a source file is moved or
+    # deleted, its last segment is recovered from memory or the disk tier and
+    # kept from then on. Segments assigned directly, or restored from a
+    # project, are kept as given.
+    def __init__(self, cache):
+        self.cache = cache
+        self.sources = OrderedDict()
+        self.read = {}
+        self.orphans = {}
+
+    def add(self, file_path, segment=None):
+        self.sources[file_path] = None
+        self._forget(file_path)
+        if segment is not None:
+            try:
+                self.read[file_path] = (self.cache.key(file_path), weakref.ref(segment))
+            except OSError:
+                self.orphans[file_path] = segment
+
+    def add_stored(self, file_path, stored_segment):
+        self.sources[file_path] = stored_segment
+        self._forget(file_path)
+
+    def _forget(self, file_path):
+        self.read.pop(file_path, None)
+        self.orphans.pop(file_path, None)
+
+    def _last_read(self, file_path, key=None):
+        # The last segment read for file_path if it is still in memory, and
+        # when key is given only if the file has not changed since.
+        last_key, ref = self.read.get(file_path, (None, None))
+        if ref is None or (key is not None and key != last_key):
+            return None
+        return ref()
+
+    def _read_missing(self, file_path):
+        segment = self.orphans.get(file_path)
+        if segment is None:
+            segment = self._last_read(file_path)
+        if segment is None and file_path in self.read:
+            segment = self.cache.lookup(self.read[file_path][0])
+        if segment is None:
+            raise FileNotFoundError(f"{file_path} no longer exists and its audio is no longer cached")
+        self.orphans[file_path] = segment
+        return segment
+
+    def __getitem__(self, file_path):
+        source = self.sources[file_path]
+        if source is None:
+            try:
+                key = self.cache.key(file_path)
+            except OSError:
+                return self._read_missing(file_path)
+            self.orphans.pop(file_path, None)
+            segment = self._last_read(file_path, key)
+            if segment is None:
+                segment = self.cache.get(file_path, key)
+                self.read[file_path] = (key, weakref.ref(segment))
+            return segment
+        if hasattr(source, "load"):
+            return source.load()
+        return source
+
+    def __setitem__(self, file_path, segment):
+        self.sources[file_path] = segment
+        self._forget(file_path)
+
+    def __delitem__(self, file_path):
+        del self.sources[file_path]
+        self._forget(file_path)
+
+    def __iter__(self):
+        return iter(self.sources)
+
+    def __len__(self):
+        return len(self.sources)
+
+    def raw_items(self):
+        for file_path, source in self.sources.items():
+            yield file_path, self[file_path] if source is None else source
+
+
+_default_cache = None
+
+
+def default_cache():
+    # AUDIO_EDITOR_CACHE_DIR enables the disk tier, AUDIO_EDITOR_CACHE_MB sets the memory budget.
+    global _default_cache
+    if _default_cache is None:
+        memory_budget = int(os.environ.get("AUDIO_EDITOR_CACHE_MB", DEFAULT_MEMORY_BUDGET // (1024 * 1024))) * 1024 * 1024
+        _default_cache = AudioCache(memory_budget, cache_dir=os.environ.get("AUDIO_EDITOR_CACHE_DIR") or None)
+    return _default_cache
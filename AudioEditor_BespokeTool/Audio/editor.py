@@ -1,11 +1,24 @@
-import numpy as np
-from scipy.io.wavfile import write
-import simpleaudio as sa
-from pydub import AudioSegment
 import random
-from scipy.signal import butter, lfilter
+import os
 import traceback
-import pyqtgraph as pg  # Import pyqtgraph
+import cache
+from startup import lazy_import
+
+# Heavy modules are imported on first use to keep application startup fast.
+np = lazy_import("numpy")
+wavfile = lazy_import("scipy.io.wavfile")
+sa = lazy_import("simpleaudio")
+pydub = lazy_import("pydub")
+pg = lazy_import("pyqtgraph")
+silence = lazy_import("silence")
+project = lazy_import("project")
+eq = lazy_import("eq")
+similarity = lazy_import("similarity")
+bank = lazy_import("bank")
+loops = lazy_import("loops")
+sequence = lazy_import("sequence")
+thumbnails = lazy_import("thumbnails")
+spatial = lazy_import("spatial")
 
 class AudioEditor:
     def __init__(self):
@@ -15,19 +28,27 @@ class AudioEditor:
         self.play_obj = None
         self.is_paused = False
         self.play_data = None
-        self.audio_files = {}
+        self.cache = cache.default_cache()
+        self.audio_files = cache.AudioLibrary(self.cache)
         self.current_audio_file = None
+        self.loaded_audio = None
         self.volume_level = 0
         self.key_points = []
         self.effects = []
         self.playhead_position = 0
+        self.similarity_index = None
+        self.loop_points = None
+        self.loop_audio = None
+        self.loop_markers = []
+        self.thumbnails = None
 
     def load_audio(self, file_path):
         try:
-            self.audio = AudioSegment.from_file(file_path)
+            self.audio = self.cache.get(file_path)
             self.current_audio_file = file_path
+            self.loaded_audio = self.audio
             self.history.append(self.audio)
-            self.audio_files[file_path] = self.audio
+            self.audio_files.add(file_path, self.audio)
             self.audio_data = np.array(self.audio.get_array_of_samples())
         except Exception as e:
             self.log_error(e)
@@ -36,6 +57,38 @@ class AudioEditor:
         try:
             if self.audio:
                 self.audio.export(file_path, format="wav")
+                loop_points = self.current_loop_points()
+                if loop_points:
+                    loops.write_loop_points(file_path, *loop_points)
+        except Exception as e:
+            self.log_error(e)
+
+    def save_project(self, file_path, mixer_state=None, compress=False):
+        try:
+            project.save_project(file_path, self, mixer_state, compress)
+        except Exception as e:
+            self.log_error(e)
+
+    def load_project(self, file_path):
+        try:
+            state = project.load_project(file_path)
+            self.stop()
+            self.audio = state["audio"]
+            self.current_audio_file = state["current_audio_file"]
+            self.loaded_audio = None
+            self.history = state["history"]
+            self.redo_stack = state["redo_stack"]
+            self.audio_files = cache.AudioLibrary(self.cache)
+            for path, stored_segment in state["audio_files"].items():
+                self.audio_files.add_stored(path, stored_segment)
+            self.volume_level = state["volume_level"]
+            self.key_points = state["key_points"]
+            self.loop_markers = []
+            self.effects = state["effects"]
+            self.play_data = None
+            self.is_paused = False
+            self.audio_data = np.array(self.audio.get_array_of_samples()) if self.audio else np.array([])
+            return state["mixer"]
         except Exception as e:
             self.log_error(e)
 
@@ -47,6 +100,34 @@ class AudioEditor:
         except Exception as e:
             self.log_error(e)
 
+    def trim_silence(self, threshold_db=-50.0, min_silence_ms=500):
+        try:
+            # Audio that is silent throughout is left as it is; returns whether anything was kept.
+            ranges = silence.segment_sound_ranges(self.audio, threshold_db=threshold_db, min_silence_ms=min_silence_ms)
+            bounds = silence.trim_bounds(ranges)
+            if bounds is None:
+                return False
+            self.audio = self.audio.get_sample_slice(*bounds)
+            self.history.append(self.audio)
+            self.audio_data = np.array(self.audio.get_array_of_samples())
+            return True
+        except Exception as e:
+            self.log_error(e)
+
+    def split_on_silence(self, output_dir, threshold_db=-50.0, min_silence_ms=500):
+        try:
+            pieces = silence.split_segment(self.audio, threshold_db=threshold_db, min_silence_ms=min_silence_ms)
+            name = os.path.splitext(os.path.basename(self.current_audio_file or "audio"))[0]
+            file_paths = []
+            for index, piece in enumerate(pieces):
+                file_path = os.path.join(output_dir, f"{name}_{index + 1:03d}.wav")
+                piece.export(file_path, format="wav")
+                file_paths.append(file_path)
+            return file_paths
+        except Exception as e:
+            self.log_error(e)
+            return []
+
     def fade_in(self, duration_ms):
         try:
             self.audio = self.audio.fade_in(duration_ms)
@@ -92,6 +173,86 @@ class AudioEditor:
         except Exception as e:
             self.log_error(e)
 
+    def apply_eq(self, bands):
+        try:
+            self.audio = eq.apply_eq(self.audio, bands)
+            self.history.append(self.audio)
+            self.audio_data = np.array(self.audio.get_array_of_samples())
+        except Exception as e:
+            self.log_error(e)
+
+    def high_pass(self, freq=100, order=2):
+        self.apply_eq([{"type": "highpass", "freq": freq, "order": order}])
+
+    def low_pass(self, freq=8000, order=2):
+        self.apply_eq([{"type": "lowpass", "freq": freq, "order": order}])
+
+    def pan(self, position):
+        try:
+            self.audio = spatial.pan_segment(self.audio, position)
+            self.history.append(self.audio)
+            self.audio_data = np.array(self.audio.get_array_of_samples())
+        except Exception as e:
+            self.log_error(e)
+
+    def stereo_width(self, width):
+        try:
+            self.audio = spatial.width_segment(self.audio, width)
+            self.history.append(self.audio)
+            self.audio_data = np.array(self.audio.get_array_of_samples())
+        except Exception as e:
+            self.log_error(e)
+
+    def spatialise(self, azimuth, hrtf_dir=None):
+        # Uses the impulse responses in hrtf_dir, or AUDIO_EDITOR_HRTF_DIR, when available.
+        try:
+            hrtf_dir = hrtf_dir or os.environ.get("AUDIO_EDITOR_HRTF_DIR") or None
+            self.audio = spatial.spatialise_segment(self.audio, azimuth, hrtf_dir)
+            self.history.append(self.audio)
+            self.audio_data = np.array(self.audio.get_array_of_samples())
+        except Exception as e:
+            self.log_error(e)
+
+    def current_loop_points(self):
+        # Loop points only apply to the audio they were found or rendered for.
+        if self.loop_audio is not None and self.loop_audio is self.audio:
+            return self.loop_points
+        return None
+
+    def find_loop_points(self, min_loop_ms=1000):
+        try:
+            start, end, score = loops.find_segment_loop(self.audio, min_loop_ms=min_loop_ms)
+            self.loop_points = (start, end)
+            self.loop_audio = self.audio
+            self._set_loop_markers([start * self.audio.channels, end * self.audio.channels])
+            return start, end, score
+        except Exception as e:
+            self.log_error(e)
+
+    def render_loop(self, crossfade_ms=50):
+        try:
+            loop_points = self.current_loop_points()
+            if loop_points is None:
+                start, end, score = loops.find_segment_loop(self.audio)
+            else:
+                start, end = loop_points
+            self.audio = loops.render_segment_loop(self.audio, start, end, crossfade_ms)
+            self.history.append(self.audio)
+            self.loop_points = (0, int(self.audio.frame_count()))
+            self.loop_audio = self.audio
+            self._set_loop_markers([])
+            self.audio_data = np.array(self.audio.get_array_of_samples())
+        except Exception as e:
+            self.log_error(e)
+
+    def _set_loop_markers(self, markers):
+        # Replaces the markers of the previous loop search, leaving the user's key points alone.
+        for marker in self.loop_markers:
+            if marker in self.key_points:
+                self.key_points.remove(marker)
+        self.loop_markers = list(markers)
+        self.key_points.extend(self.loop_markers)
+
     def pitch_up(self, semitones):
         try:
             self.audio = self.audio._spawn(self.audio.raw_data, overrides={"frame_rate": int(self.audio.frame_rate * (2.0 ** (semitones / 12.0)))})
@@ -132,11 +293,11 @@ class AudioEditor:
         try:
             if self.audio:
                 if self.is_paused and self.play_data:
-                    self.play_obj = sa.play_buffer(self.play_data, num_channels=2, bytes_per_sample=self.audio.sample_width, sample_rate=self.audio.frame_rate)
+                    self.play_obj = sa.play_buffer(self.play_data, num_channels=self.audio.channels, bytes_per_sample=self.audio.sample_width, sample_rate=self.audio.frame_rate)
                     self.is_paused = False
                 else:
                     self.play_data = self.audio.raw_data
-                    self.play_obj = sa.play_buffer(self.play_data, num_channels=2, bytes_per_sample=self.audio.sample_width, sample_rate=self.audio.frame_rate)
+                    self.play_obj = sa.play_buffer(self.play_data, num_channels=self.audio.channels, bytes_per_sample=self.audio.sample_width, sample_rate=self.audio.frame_rate)
                 self.update_playhead()
         except Exception as e:
             self.log_error(e)
@@ -194,7 +355,7 @@ class AudioEditor:
     def play_generated_audio(self):
         try:
             play_data = self.audio.raw_data
-            self.play_obj = sa.play_buffer(play_data, num_channels=2, bytes_per_sample=self.audio.sample_width, sample_rate=self.audio.frame_rate)
+            self.play_obj = sa.play_buffer(play_data, num_channels=self.audio.channels, bytes_per_sample=self.audio.sample_width, sample_rate=self.audio.frame_rate)
         except Exception as e:
             self.log_error(e)
 
@@ -209,12 +370,77 @@ class AudioEditor:
         except Exception as e:
             self.log_error(e)
 
+    def assemble_sequence(self, file_paths, crossfade_ms=50, curve="equal_power"):
+        # Places the files one after another, each crossfaded into the next.
+        try:
+            if not file_paths:
+                return
+            first = self.audio_files[file_paths[0]]
+            timeline = sequence.Sequence(first.frame_rate, first.channels, first.sample_width,
+                                         loader=lambda path: self.audio_files[path] if path in self.audio_files else self.cache.get(path))
+            for file_path in file_paths:
+                timeline.add(file_path, crossfade_ms=crossfade_ms, curve=curve)
+            self.audio = timeline.render()
+            self.history.append(self.audio)
+            self.audio_data = np.array(self.audio.get_array_of_samples())
+        except Exception as e:
+            self.log_error(e)
+
     def add_audio_file(self, file_path):
         try:
-            audio = AudioSegment.from_file(file_path)
-            self.audio_files[file_path] = audio
+            self.audio_files.add(file_path, self.cache.get(file_path))
+        except Exception as e:
+            self.log_error(e)
+
+    def add_imported_audio(self, file_path, segment):
+        try:
+            self.cache.put(file_path, segment)
+            self.audio_files.add(file_path, segment)
+        except Exception as e:
+            self.log_error(e)
+
+    def library_similarity(self):
+        # The similarity index and the library files it should cover.
+        if self.similarity_index is None:
+            index_dir = os.environ.get("AUDIO_EDITOR_INDEX_DIR") or os.path.join(os.path.expanduser("~"), ".audio_editor", "similarity")
+            self.similarity_index = similarity.SimilarityIndex(index_dir)
+        return self.similarity_index, [path for path in self.audio_files if os.path.isfile(path)]
+
+    def similarity_query(self):
+        # (file path, segment) to search with. The file's indexed fingerprint is
+        # only used while the audio on screen is that file, unedited.
+        if self.audio is not None and self.audio is self.loaded_audio:
+            return self.current_audio_file, self.audio
+        return None, self.audio
+
+    def find_similar(self, k=10):
+        # Blocks while new library files are fingerprinted; the GUI runs this
+        # through importer.start_similarity instead.
+        try:
+            index, file_paths = self.library_similarity()
+            index.update(file_paths)
+            return similarity.query_audio(index, *self.similarity_query(), k)
+        except Exception as e:
+            self.log_error(e)
+            return []
+
+    def library_thumbnails(self, file_paths):
+        # Cached thumbnails by path, with None for files still to be computed.
+        try:
+            if self.thumbnails is None:
+                self.thumbnails = thumbnails.ThumbnailCache()
+            return {file_path: self.thumbnails.get(file_path) for file_path in file_paths}
+        except Exception as e:
+            self.log_error(e)
+            return {}
+
+    def export_sound_bank(self, file_path):
+        try:
+            assets = [bank.file_asset(path) for path in self.audio_files if os.path.isfile(path)]
+            return bank.build_bank(file_path, assets)
         except Exception as e:
             self.log_error(e)
+            return [], []
 
     def export_custom_audio(self, file_path, freq, duration, volume):
         try:
@@ -235,8 +461,8 @@ class AudioEditor:
                 wave = 0.5 * np.random.uniform(-1, 1, size=t.shape)
 
             wave = (wave * 32767 * (volume / 100)).astype(np.int16)
-            write("generated_sound.wav", sample_rate, wave)
-            self.audio = AudioSegment.from_wav("generated_sound.wav")
+            wavfile.write("generated_sound.wav", sample_rate, wave)
+            self.audio = pydub.AudioSegment.from_wav("generated_sound.wav")
             self.history.append(self.audio)
             self.audio_data = np.array(self.audio.get_array_of_samples())
         except Exception as e:
@@ -0,0 +1,85 @@
+import numpy as np
+from scipy.signal import butter, sosfilt
+from pcm import segment_to_array, array_to_segment, iter_array_blocks
+
+# Parametric EQ built from second-order sections. Every band becomes one or
+# more biquad rows and the whole chain runs as a single sosfilt call over a
+# (frames, channels) buffer. Filter state is kept between calls, so audio can
+# be processed block by block with the same result as one pass.
+
+FILTER_TYPES = ('lowpass', 'highpass', 'lowshelf', 'highshelf', 'peaking', 'bandpass')
+
+
+def _biquad(b0, b1, b2, a0, a1, a2):
+    return np.array([[b0 / a0, b1 / a0, b2 / a0, 1.0, a1 / a0, a2 / a0]])
+
+
+def design_band(frame_rate, type, freq, gain_db=0.0, q=0.707, order=2):
+    # Shelves, peaking and band-pass follow the RBJ audio EQ cookbook.
+    # Low/high-pass are Butterworth filters of the given order.
+    nyquist = frame_rate / 2.0
+    freq = min(max(float(freq), 1.0), nyquist * 0.999)
+    if type in ('lowpass', 'highpass'):
+        return butter(order, freq, btype=type, fs=frame_rate, output='sos')
+
+    w0 = 2 * np.pi * freq / frame_rate
+    cos_w0 = np.cos(w0)
+    alpha = np.sin(w0) / (2 * q)
+    a = 10 ** (gain_db / 40.0)
+    if type == 'peaking':
+        return _biquad(1 + alpha * a, -2 * cos_w0, 1 - alpha * a, 1 + alpha / a, -2 * cos_w0, 1 - alpha / a)
+    if type == 'bandpass':
+        return _biquad(alpha, 0.0, -alpha, 1 + alpha, -2 * cos_w0, 1 - alpha)
+    if type in ('lowshelf', 'highshelf'):
+        root = 2 * np.sqrt(a) * alpha
+        sign = 1 if type == 'lowshelf' else -1
+        return _biquad(a * ((a + 1) - sign * (a - 1) * cos_w0 + root),
+                       sign * 2 * a * ((a - 1) - sign * (a + 1) * cos_w0),
+                       a * ((a + 1) - sign * (a - 1) * cos_w0 - root),
+                       (a + 1) + sign * (a - 1) * cos_w0 + root,
+                       -sign * 2 * ((a - 1) + sign * (a + 1) * cos_w0),
+                       (a + 1) + sign * (a - 1) * cos_w0 - root)
+    raise ValueError(f"Unknown filter type: {type}")
+
+
+def design_chain(frame_rate, bands):
+    if not bands:
+        return np.array([[1.0, 0.0, 0.0, 1.0, 0.0, 0.0]])
+    return np.concatenate([design_band(frame_rate, **band) for band in bands])
+
+
+class Equalizer:
+    def __init__(self, frame_rate, channels, bands=None):
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.set_bands(bands or [])
+
+    def set_bands(self, bands):
+        self.bands = [dict(band) for band in bands]
+        self.sos = design_chain(self.frame_rate, self.bands)
+        self.reset()
+
+    def reset(self):
+        self.zi = np.zeros((len(self.sos), 2, self.channels))
+
+    def process(self, block):
+        # block is a (frames, channels) array; the filter state carries over to the next call.
+        block = np.asarray(block, dtype=np.float64)
+        output, self.zi = sosfilt(self.sos, block, axis=0, zi=self.zi)
+        return output
+
+    def process_blocks(self, blocks):
+        for block in blocks:
+            yield self.process(block)
+
+    def apply(self, data, block_frames=None):
+        self.reset()
+        if block_frames is None:
+            return self.process(data)
+        return np.concatenate(list(self.process_blocks(iter_array_blocks(data, block_frames))))
+
+
+def apply_eq(segment, bands, block_frames=1 << 16):
+    equalizer = Equalizer(segment.frame_rate, segment.channels, bands)
+    data = equalizer.apply(segment_to_array(segment), block_frames)
+    return array_to_segment(data, segment.frame_rate, segment.sample_width)
@@ -0,0 +1,122 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from PyQt5.QtCore import QObject, QThread, pyqtSignal
+from cache import decode_to_cache
+
+
+class ImportWorker(QObject):
+    # Decodes files in a process pool from a background thread. Results are
+    # delivered through signals, which Qt queues onto the GUI thread.
+    file_imported = pyqtSignal(str, object)
+    file_failed = pyqtSignal(str, str)
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal()
+
+    def __init__(self, file_paths, cache_dir=None, key_by_hash=False, workers=None):
+        super().__init__()
+        self.file_paths = list(file_paths)
+        self.cache_dir = cache_dir
+        self.key_by_hash = key_by_hash
+        self.workers = workers or os.cpu_count()
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        from pydub import AudioSegment
+        total = len(self.file_paths)
+        done = 0
+        self.progress.emit(done, total)
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(decode_to_cache, file_path, self.cache_dir, self.key_by_hash): file_path
+                       for file_path in self.file_paths}
+            for future in as_completed(futures):
+                if self.cancelled:
+                    # Files not started yet are dropped; the pool waits only for running ones.
+                    for pending in futures:
+                        pending.cancel()
+                    break
+                try:
+                    file_path, raw_data, frame_rate, channels, sample_width = future.result()
+                    segment = AudioSegment(data=raw_data, sample_width=sample_width, frame_rate=frame_rate, channels=channels)
+                    self.file_imported.emit(file_path, segment)
+                except Exception as e:
+                    self.file_failed.emit(futures[future], str(e))
+                done += 1
+                self.progress.emit(done, total)
+        self.finished.emit()
+
+
+class ThumbnailWorker(QObject):
+    # Computes missing waveform thumbnails in a process pool from a background thread.
+    thumbnail_ready = pyqtSignal(str, object)
+    finished = pyqtSignal()
+
+    def __init__(self, thumbnails, file_paths, workers=None):
+        super().__init__()
+        self.thumbnails = thumbnails
+        self.file_paths = list(file_paths)
+        self.workers = workers
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        updates = self.thumbnails.iter_update(self.file_paths, self.workers)
+        for file_path, peaks, error in updates:
+            if self.cancelled:
+                updates.close()
+                break
+            if error is None:
+                self.thumbnail_ready.emit(file_path, peaks)
+        self.finished.emit()
+
+
+class SimilarityWorker(QObject):
+    # Brings the similarity index up to date with the library and runs the
+    # query away from the GUI thread.
+    results_ready = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    finished = pyqtSignal()
+
+    def __init__(self, index, file_paths, query_path=None, query_segment=None, k=10, workers=None):
+        super().__init__()
+        self.index = index
+        self.file_paths = list(file_paths)
+        self.query_path = query_path
+        self.query_segment = query_segment
+        self.k = k
+        self.workers = workers
+
+    def run(self):
+        from similarity import query_audio
+        try:
+            self.index.update(self.file_paths, self.workers)
+            self.results_ready.emit(query_audio(self.index, self.query_path, self.query_segment, self.k))
+        except Exception as e:
+            self.failed.emit(str(e))
+        self.finished.emit()
+
+
+def _start_worker(worker):
+    # Returns the thread and worker; the caller keeps references to both and
+    # connects its slots before calling thread.start().
+    thread = QThread()
+    worker.moveToThread(thread)
+    thread.started.connect(worker.run)
+    worker.finished.connect(thread.quit)
+    return thread, worker
+
+
+def start_import(file_paths, cache_dir=None, key_by_hash=False, workers=None):
+    return _start_worker(ImportWorker(file_paths, cache_dir, key_by_hash, workers))
+
+
+def start_thumbnails(thumbnails, file_paths, workers=None):
+    return _start_worker(ThumbnailWorker(thumbnails, file_paths, workers))
+
+
+def start_similarity(index, file_paths, query_path=None, query_segment=None, k=10, workers=None):
+    return _start_worker(SimilarityWorker(index, file_paths, query_path, query_segment, k, workers))
@@ -0,0 +1,178 @@
+import os
+import json
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from scipy.fft import rfft, irfft, next_fast_len
+from scipy.signal import resample_poly
+from pcm import segment_to_array, array_to_segment, find_audio_files
+
+# Seamless loop points for music and ambience beds.
+#
+# The audio just before a candidate loop end is used as a template and
+# matched against every position in the start region with normalised
+# cross-correlation. All end candidates are correlated in one batched FFT on
+# a decimated signal, and the best match is then refined at the full rate.
+# The loop is rendered with an equal-power crossfade from the end of the loop
+# into the audio leading up to its start, so playback wraps without a click.
+
+LOOP_SUFFIX = ".loop.json"
+ANALYSIS_RATE = 8000
+
+
+def _sliding_norms(signal, length):
+    energy = np.concatenate([[0.0], np.cumsum(signal * signal)])
+    return np.sqrt(np.maximum(energy[length:] - energy[:-length], 0.0))
+
+
+def _match(region, templates):
+    # Normalised cross-correlation of each template (row) against every window of region.
+    length = templates.shape[1]
+    size = next_fast_len(len(region) + length - 1, real=True)
+    spectrum = rfft(region, size) * rfft(templates[:, ::-1], size, axis=1)
+    correlation = irfft(spectrum, size, axis=1)[:, length - 1:len(region)]
+    norms = np.linalg.norm(templates, axis=1)[:, None] * _sliding_norms(region, length)[None, :]
+    return correlation / (norms + 1e-12)
+
+
+def find_loop_points(data, frame_rate, min_loop_ms=1000, window_ms=100, candidates=16,
+                     start_range=None, end_range=None):
+    # Returns (start_frame, end_frame, score) where score is the correlation in [-1, 1].
+    # start_range and end_range are (first, last) frames to search; by default the
+    # start is searched in the first quarter of the audio and the end in the last.
+    mono = np.asarray(data, dtype=np.float64).mean(axis=1)
+    frames = len(mono)
+    window = max(1, int(frame_rate * window_ms / 1000))
+    min_loop = int(frame_rate * min_loop_ms / 1000)
+    start_lo, start_hi = start_range or (window, frames // 4)
+    end_lo, end_hi = end_range or (frames - frames // 4, frames)
+    start_lo = max(start_lo, window)
+    end_hi = min(end_hi, frames)
+    if start_hi <= start_lo or end_hi <= end_lo or end_hi - start_lo < min_loop:
+        raise ValueError("Audio is too short to search for loop points")
+
+    factor = max(1, frame_rate // ANALYSIS_RATE)
+    coarse = resample_poly(mono, 1, factor) if factor > 1 else mono
+    coarse_window = max(1, window // factor)
+    ends = np.unique(np.linspace(end_lo // factor, end_hi // factor, candidates).astype(np.int64))
+    ends = ends[ends >= coarse_window]
+    templates = np.stack([coarse[end - coarse_window:end] for end in ends])
+    first = start_lo // factor
+    region = coarse[first - coarse_window:start_hi // factor]
+    scores = _match(region, templates)
+    starts = first + np.arange(scores.shape[1])
+    scores[(ends[:, None] - starts[None, :]) * factor < min_loop] = -np.inf
+    best_end, best_start = np.unravel_index(np.argmax(scores), scores.shape)
+    start, end = int(starts[best_start]) * factor, min(int(ends[best_end]) * factor, frames)
+
+    # Refine the start at the full rate around the coarse match.
+    lo = max(window, start - 2 * factor)
+    hi = min(frames, start + 2 * factor, end - min_loop)
+    if hi >= lo:
+        fine = _match(mono[lo - window:hi], mono[end - window:end][None, :])[0]
+        offset = int(np.argmax(fine))
+        return lo + offset, end, float(fine[offset])
+    return start, end, float(scores[best_end, best_start])
+
+
+def render_loop(data, start, end, crossfade_frames):
+    # The end of the loop is crossfaded into the audio leading up to start, so
+    # the last frame of the loop flows straight into its first frame.
+    crossfade_frames = max(0, min(crossfade_frames, start, end - start))
+    loop = np.array(data[start:end], dtype=np.float64)
+    if crossfade_frames:
+        t = np.linspace(0.0, 1.0, crossfade_frames, endpoint=False)[:, None]
+        lead_in = data[start - crossfade_frames:start]
+        loop[-crossfade_frames:] = loop[-crossfade_frames:] * np.cos(t * np.pi / 2) + lead_in * np.sin(t * np.pi / 2)
+    return loop
+
+
+def find_segment_loop(segment, **options):
+    return find_loop_points(segment_to_array(segment), segment.frame_rate, **options)
+
+
+def render_segment_loop(segment, start, end, crossfade_ms=50):
+    data = render_loop(segment_to_array(segment), start, end, int(segment.frame_rate * crossfade_ms / 1000))
+    return array_to_segment(data, segment.frame_rate, segment.sample_width)
+
+
+def write_loop_points(file_path, start, end, score=None):
+    with open(file_path + LOOP_SUFFIX, "w") as f:
+        json.dump({"loop_start": start, "loop_end": end, "score": score}, f)
+
+
+def read_loop_points(file_path):
+    try:
+        with open(file_path + LOOP_SUFFIX) as f:
+            points = json.load(f)
+        return points["loop_start"], points["loop_end"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def process_file(file_path, output_dir, render=True, crossfade_ms=50, **options):
+    # Writes the rendered loop to output_dir with a .loop.json file holding its
+    # loop points. Without render, the loop points of the source file are
+    # written next to the source instead.
+    from cache import decode_file
+    segment = decode_file(file_path)
+    start, end, score = find_segment_loop(segment, **options)
+    if not render:
+        write_loop_points(file_path, start, end, score)
+        return file_path, start, end, score
+    name = os.path.splitext(os.path.basename(file_path))[0] + ".wav"
+    output_path = os.path.join(output_dir, name)
+    os.makedirs(output_dir, exist_ok=True)
+    loop = render_segment_loop(segment, start, end, crossfade_ms)
+    loop.export(output_path, format="wav")
+    write_loop_points(output_path, 0, int(loop.frame_count()), score)
+    return output_path, start, end, score
+
+
+def _process_file_job(file_path, output_dir, render, options):
+    try:
+        return file_path, process_file(file_path, output_dir, render, **options), None
+    except Exception as e:
+        return file_path, None, f"{e}\n{traceback.format_exc()}"
+
+
+def batch_process(input_dir, output_dir, render=True, workers=None, **options):
+    results = {}
+    errors = {}
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = []
+        for file_path in find_audio_files(input_dir):
+            relative_dir = os.path.dirname(os.path.relpath(file_path, input_dir))
+            futures.append(pool.submit(_process_file_job, file_path, os.path.join(output_dir, relative_dir), render, options))
+        for future in as_completed(futures):
+            file_path, result, error = future.result()
+            if error:
+                errors[file_path] = error
+            else:
+                results[file_path] = result
+    return results, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find seamless loop points and render loops.")
+    parser.add_argument("input_dir")
+    parser.add_argument("output_dir")
+    parser.add_argument("--points-only", action="store_true", help="write loop points next to the source files instead of rendering loops")
+    parser.add_argument("--crossfade-ms", type=int, default=50)
+    parser.add_argument("--min-loop-ms", type=int, default=1000)
+    parser.add_argument("--window-ms", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    results, errors = batch_process(args.input_dir, args.output_dir, render=not args.points_only,
+                                    workers=args.workers, crossfade_ms=args.crossfade_ms,
+                                    min_loop_ms=args.min_loop_ms, window_ms=args.window_ms)
+    for file_path, (output_path, start, end, score) in sorted(results.items()):
+        print(f"{file_path}: loop {start}-{end} (match {score:.3f}) -> {output_path}")
+    for file_path, error in sorted(errors.items()):
+        print(f"Error processing {file_path}: {error}")
+
+
+if __name__ == "__main__":
+    main()
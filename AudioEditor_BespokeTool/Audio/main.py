@@ -1,17 +1,49 @@
+import os
 import sys
-from PyQt5.QtWidgets import QApplication, QFileDialog
-from PyQt5.QtCore import QTimer  # Import QTimer
+import startup
+from PyQt5.QtWidgets import QApplication, QFileDialog, QListWidgetItem
+from PyQt5.QtCore import Qt, QTimer  # Import QTimer
 from ui import AudioEditorUI
 from editor import AudioEditor
-from utils import plot_waveform  # Ensure this import is included
+from utils import plot_waveform, thumbnail_icon  # Ensure this import is included
+startup.mark("imports")
 
 class AudioEditorApp(AudioEditorUI):
-    def __init__(self):
+    def __init__(self, quit_after_paint=False):
         super().__init__()
+        startup.mark("ui constructed")
         self.audio_editor = AudioEditor()
+        self.quit_after_paint = quit_after_paint
+        self.first_paint_done = False
         self.key_point_added.connect(self.add_key_point_to_editor)
         self.playhead_timer = QTimer(self)
         self.playhead_timer.timeout.connect(self.update_playhead)
+        self.import_thread = None
+        self.import_worker = None
+        self.import_failures = []
+        self.similarity_thread = None
+        self.similarity_worker = None
+        self.thumbnail_thread = None
+        self.thumbnail_worker = None
+        self.library_items = {}
+        startup.mark("editor constructed")
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.first_paint_done:
+            self.first_paint_done = True
+            startup.mark("first paint")
+            # The waveform view pulls in pyqtgraph, so it is built once the
+            # window is already on screen.
+            QTimer.singleShot(0, self.finish_startup)
+
+    def finish_startup(self):
+        self.ensure_waveform_view()
+        startup.mark("waveform view")
+        if startup.enabled() or self.quit_after_paint:
+            print(startup.report(), flush=True)
+        if self.quit_after_paint:
+            QApplication.instance().quit()
 
     def open_file(self):
         try:
@@ -23,6 +55,47 @@ class AudioEditorApp(AudioEditorUI):
         except Exception as e:
             self.show_error_message(str(e))
 
+    def save_project(self):
+        try:
+            file_path, _ = QFileDialog.getSaveFileName(self, "Save Project", "", "Audio Projects (*.aproj)")
+            if file_path:
+                self.audio_editor.save_project(file_path, self.get_mixer_state())
+        except Exception as e:
+            self.show_error_message(str(e))
+
+    def open_project(self):
+        try:
+            file_path, _ = QFileDialog.getOpenFileName(self, "Open Project", "", "Audio Projects (*.aproj)")
+            if file_path:
+                mixer_state = self.audio_editor.load_project(file_path)
+                if mixer_state is not None:
+                    self.set_mixer_state(mixer_state)
+                    self.key_points = list(self.audio_editor.key_points)
+                    self.plot_waveform()
+        except Exception as e:
+            self.show_error_message(str(e))
+
+    def get_mixer_state(self):
+        self.ensure_tab(self.mixer_tab)
+        return {
+            "mix_select1": [self.mix_select1.itemText(i) for i in range(self.mix_select1.count())],
+            "mix_select2": [self.mix_select2.itemText(i) for i in range(self.mix_select2.count())],
+            "mix_selected1": self.mix_select1.currentText(),
+            "mix_selected2": self.mix_select2.currentText(),
+            "volume_slider": self.volume_slider.value(),
+        }
+
+    def set_mixer_state(self, mixer_state):
+        self.ensure_tab(self.mixer_tab)
+        for combo, items, selected in ((self.mix_select1, "mix_select1", "mix_selected1"),
+                                       (self.mix_select2, "mix_select2", "mix_selected2")):
+            combo.clear()
+            combo.addItems(mixer_state.get(items, []))
+            combo.setCurrentText(mixer_state.get(selected, ""))
+        self.volume_slider.blockSignals(True)
+        self.volume_slider.setValue(mixer_state.get("volume_slider", 0))
+        self.volume_slider.blockSignals(False)
+
     def play_audio(self):
         try:
             self.audio_editor.play()
@@ -62,6 +135,24 @@ class AudioEditorApp(AudioEditorUI):
         except ValueError as e:
             self.show_error_message(str(e))
 
+    def trim_silence(self):
+        try:
+            if self.audio_editor.trim_silence() is False:
+                self.show_error_message("The audio is silent throughout, so nothing was trimmed.")
+            self.plot_waveform()
+        except Exception as e:
+            self.show_error_message(str(e))
+
+    def split_on_silence(self):
+        try:
+            output_dir = QFileDialog.getExistingDirectory(self, "Select Output Folder")
+            if output_dir:
+                for file_path in self.audio_editor.split_on_silence(output_dir):
+                    self.audio_editor.add_audio_file(file_path)
+                    self.update_mix_selects(file_path)
+        except Exception as e:
+            self.show_error_message(str(e))
+
     def fade_in(self):
         try:
             self.audio_editor.fade_in(2000)
@@ -90,6 +181,57 @@ class AudioEditorApp(AudioEditorUI):
         except Exception as e:
             self.show_error_message(str(e))
 
+    def high_pass(self):
+        try:
+            self.audio_editor.high_pass(100)
+            self.plot_waveform()
+        except Exception as e:
+            self.show_error_message(str(e))
+
+    def low_pass(self):
+        try:
+            self.audio_editor.low_pass(8000)
+            self.plot_waveform()
+        except Exception as e:
+            self.show_error_message(str(e))
+
+    def find_loop_points(self):
+        try:
+            if self.audio_editor.find_loop_points():
+                self.key_points = list(self.audio_editor.key_points)
+            self.plot_waveform()
+        except Exception as e:
+            self.show_error_message(str(e))
+
+    def render_loop(self):
+        try:
+            self.audio_editor.render_loop(50)
+            self.key_points = list(self.audio_editor.key_points)
+            self.plot_waveform()
+        except Exception as e:
+            self.show_error_message(str(e))
+
+    def pan_left(self):
+        try:
+            self.audio_editor.pan(-0.5)
+            self.plot_waveform()
+        except Exception as e:
+            self.show_error_message(str(e))
+
+    def pan_right(self):
+        try:
+            self.audio_editor.pan(0.5)
+            self.plot_waveform()
+        except Exception as e:
+            self.show_error_message(str(e))
+
+    def widen_stereo(self):
+        try:
+            self.audio_editor.stereo_width(1.5)
+            self.plot_waveform()
+        except Exception as e:
+            self.show_error_message(str(e))
+
     def pitch_up(self):
         try:
             self.audio_editor.pitch_up(1)
@@ -125,6 +267,14 @@ class AudioEditorApp(AudioEditorUI):
         except Exception as e:
             self.show_error_message(str(e))
 
+    def export_sound_bank(self):
+        try:
+            file_path, _ = QFileDialog.getSaveFileName(self, "Export Sound Bank", "", "Sound Banks (*.bank)")
+            if file_path:
+                self.audio_editor.export_sound_bank(file_path)
+        except Exception as e:
+            self.show_error_message(str(e))
+
     def undo(self):
         try:
             self.audio_editor.undo()
@@ -141,6 +291,7 @@ class AudioEditorApp(AudioEditorUI):
 
     def plot_waveform(self):
         try:
+            self.ensure_waveform_view()
             plot_waveform(self.plot_widget, self.audio_editor.audio_data, self.key_points)
             self.playhead_line.setPos(self.audio_editor.playhead_position)
         except Exception as e:
@@ -174,8 +325,43 @@ class AudioEditorApp(AudioEditorUI):
         except Exception as e:
             self.show_error_message(str(e))
 
+    def find_similar(self):
+        try:
+            import importer
+            self.ensure_tab(self.sound_banks_tab)
+            if self.similarity_thread is not None:
+                return
+            editor = self.audio_editor
+            index, file_paths = editor.library_similarity()
+            self.similar_list.clear()
+            self.similar_list.addItem("Searching...")
+            self.find_similar_button.setEnabled(False)
+            self.similarity_thread, self.similarity_worker = importer.start_similarity(
+                index, file_paths, *editor.similarity_query())
+            self.similarity_worker.results_ready.connect(self.on_similar_found)
+            self.similarity_worker.failed.connect(self.show_error_message)
+            self.similarity_thread.finished.connect(self.on_similarity_finished)
+            self.similarity_thread.start()
+        except Exception as e:
+            self.show_error_message(str(e))
+
+    def on_similar_found(self, results):
+        self.similar_list.clear()
+        for file_path, score in results:
+            self.similar_list.addItem(f"{score:.3f}  {file_path}")
+
+    def on_similarity_finished(self):
+        if self.similar_list.count() == 1 and self.similar_list.item(0).text() == "Searching...":
+            self.similar_list.clear()
+        self.find_similar_button.setEnabled(True)
+        self.similarity_worker.deleteLater()
+        self.similarity_thread.deleteLater()
+        self.similarity_thread = None
+        self.similarity_worker = None
+
     def update_mix_selects(self, file_path):
         try:
+            self.ensure_tab(self.mixer_tab)
             self.mix_select1.addItem(file_path)
             self.mix_select2.addItem(file_path)
         except Exception as e:
@@ -190,6 +376,13 @@ class AudioEditorApp(AudioEditorUI):
         except Exception as e:
             self.show_error_message(str(e))
 
+    def assemble_sequence(self):
+        try:
+            self.audio_editor.assemble_sequence(list(self.audio_editor.audio_files))
+            self.plot_waveform()
+        except Exception as e:
+            self.show_error_message(str(e))
+
     def add_audio_file(self):
         try:
             file_path, _ = QFileDialog.getOpenFileName(self, "Add Audio File", "", "Audio Files (*.wav *.mp3 *.flac)")
@@ -199,6 +392,148 @@ class AudioEditorApp(AudioEditorUI):
         except Exception as e:
             self.show_error_message(str(e))
 
+    def import_files(self):
+        try:
+            file_paths, _ = QFileDialog.getOpenFileNames(self, "Import Audio Files", "", "Audio Files (*.wav *.mp3 *.flac)")
+            if file_paths:
+                self.start_import(file_paths)
+        except Exception as e:
+            self.show_error_message(str(e))
+
+    def import_folder(self):
+        try:
+            folder = QFileDialog.getExistingDirectory(self, "Import Audio Folder")
+            if folder:
+                from pcm import find_audio_files
+                self.start_import(find_audio_files(folder))
+        except Exception as e:
+            self.show_error_message(str(e))
+
+    def start_import(self, file_paths):
+        import importer
+        self.ensure_tab(self.mixer_tab)
+        if self.import_thread is not None:
+            self.show_error_message("An import is already running.")
+            return
+        pending = []
+        for file_path in file_paths:
+            if file_path in self.audio_editor.audio_files:
+                continue
+            if self.audio_editor.cache.contains(file_path, include_disk=False):
+                self.audio_editor.add_audio_file(file_path)
+                self.update_mix_selects(file_path)
+            else:
+                pending.append(file_path)
+        if not pending:
+            return
+        cache = self.audio_editor.cache
+        self.import_thread, self.import_worker = importer.start_import(pending, cache.cache_dir, cache.key_by_hash)
+        self.import_worker.file_imported.connect(self.on_file_imported)
+        self.import_worker.file_failed.connect(self.on_import_failed)
+        self.import_worker.progress.connect(self.on_import_progress)
+        self.import_thread.finished.connect(self.on_import_finished)
+        self.import_progress.setRange(0, len(pending))
+        self.import_progress.setValue(0)
+        self.import_progress.show()
+        self.import_thread.start()
+
+    def on_file_imported(self, file_path, segment):
+        self.audio_editor.add_imported_audio(file_path, segment)
+        self.update_mix_selects(file_path)
+
+    def on_import_failed(self, file_path, message):
+        self.audio_editor.log_error(Exception(f"Could not import {file_path}: {message}"))
+        self.import_failures.append(file_path)
+
+    def on_import_progress(self, done, total):
+        self.import_progress.setMaximum(total)
+        self.import_progress.setValue(done)
+
+    def on_import_finished(self):
+        self.import_progress.hide()
+        self.import_worker.deleteLater()
+        self.import_thread.deleteLater()
+        self.import_thread = None
+        self.import_worker = None
+        if self.import_failures:
+            failures = self.import_failures
+            self.import_failures = []
+            listed = "\n".join(failures[:20])
+            more = f"\n...and {len(failures) - 20} more" if len(failures) > 20 else ""
+            self.show_error_message(f"{len(failures)} file(s) could not be imported:\n{listed}{more}")
+
+    def browse_library(self):
+        try:
+            folder = QFileDialog.getExistingDirectory(self, "Browse Sound Library")
+            if folder:
+                from pcm import find_audio_files
+                self.show_library(find_audio_files(folder))
+        except Exception as e:
+            self.show_error_message(str(e))
+
+    def show_library(self, file_paths):
+        # Lists the files with their cached thumbnails straight away; missing
+        # thumbnails are computed in the background and filled in as they arrive.
+        import importer
+        self.ensure_tab(self.mixer_tab)
+        self.stop_thumbnails()
+        self.library_list.clear()
+        self.library_items = {}
+        thumbnails = self.audio_editor.library_thumbnails(file_paths)
+        for file_path in file_paths:
+            item = QListWidgetItem(os.path.basename(file_path))
+            item.setData(Qt.UserRole, file_path)
+            item.setToolTip(file_path)
+            if thumbnails.get(file_path) is not None:
+                item.setIcon(thumbnail_icon(thumbnails[file_path]))
+            self.library_list.addItem(item)
+            self.library_items[file_path] = item
+        missing = [file_path for file_path in file_paths if thumbnails.get(file_path) is None]
+        if missing and self.audio_editor.thumbnails is not None:
+            self.thumbnail_thread, self.thumbnail_worker = importer.start_thumbnails(self.audio_editor.thumbnails, missing)
+            self.thumbnail_worker.thumbnail_ready.connect(self.on_thumbnail_ready)
+            self.thumbnail_thread.finished.connect(self.on_thumbnails_finished)
+            self.thumbnail_thread.start()
+
+    def on_thumbnail_ready(self, file_path, peaks):
+        item = self.library_items.get(file_path)
+        if item is not None:
+            item.setIcon(thumbnail_icon(peaks))
+
+    def on_thumbnails_finished(self):
+        self.thumbnail_worker.deleteLater()
+        self.thumbnail_thread.deleteLater()
+        self.thumbnail_thread = None
+        self.thumbnail_worker = None
+
+    def stop_thumbnails(self):
+        if self.thumbnail_thread is not None:
+            self.thumbnail_thread.finished.disconnect(self.on_thumbnails_finished)
+            self.thumbnail_worker.cancel()
+            self.thumbnail_thread.quit()
+            self.thumbnail_thread.wait()
+            self.on_thumbnails_finished()
+
+    def open_library_item(self, item):
+        # Only the file that is opened is decoded in full.
+        try:
+            self.audio_editor.load_audio(item.data(Qt.UserRole))
+            self.plot_waveform()
+        except Exception as e:
+            self.show_error_message(str(e))
+
+    def closeEvent(self, event):
+        if self.import_thread is not None:
+            self.import_worker.cancel()
+            self.import_thread.quit()
+            self.import_thread.wait()
+        self.stop_thumbnails()
+        if self.similarity_thread is not None:
+            # Indexing cannot be interrupted part way; let the current update finish.
+            self.similarity_thread.quit()
+            self.similarity_thread.wait()
+        super().closeEvent(event)
+
     def apply_noise_reduction(self):
         try:
             self.audio_editor.noise_reduction()
@@ -218,10 +553,14 @@ class AudioEditorApp(AudioEditorUI):
         self.plot_waveform()
 
     def update_playhead(self):
+        self.ensure_waveform_view()
         self.playhead_line.setPos(self.audio_editor.playhead_position)
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    window = AudioEditorApp()
+    # --startup-benchmark prints the startup timings and exits after the first paint.
+    quit_after_paint = "--startup-benchmark" in sys.argv
+    app = QApplication([arg for arg in sys.argv if arg != "--startup-benchmark"])
+    startup.mark("application created")
+    window = AudioEditorApp(quit_after_paint)
     window.show()
     sys.exit(app.exec_())
@@ -0,0 +1,131 @@
+import os
+import wave
+import numpy as np
+
+# Helpers for moving audio between pydub segments, NumPy arrays and WAV files.
+# Arrays are float32 shaped (frames, channels) and scaled to [-1.0, 1.0).
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.flac')
+
+# 8-bit WAV files are unsigned, while pydub keeps 8-bit samples signed in memory.
+SAMPLE_DTYPES = {1: np.int8, 2: np.int16, 4: np.int32}
+
+
+def bytes_to_array(raw_data, channels, sample_width, unsigned_8bit=False):
+    if sample_width == 3:
+        raw = np.frombuffer(raw_data, dtype=np.uint8).reshape(-1, 3)
+        samples = (raw[:, 0].astype(np.int32) | (raw[:, 1].astype(np.int32) << 8) | (raw[:, 2].astype(np.int32) << 16))
+        samples = np.where(samples >= 1 << 23, samples - (1 << 24), samples)
+    elif sample_width == 1 and unsigned_8bit:
+        samples = np.frombuffer(raw_data, dtype=np.uint8).astype(np.int16) - 128
+    else:
+        samples = np.frombuffer(raw_data, dtype=SAMPLE_DTYPES[sample_width])
+    data = samples.astype(np.float32)
+    data /= float(1 << (8 * sample_width - 1))
+    return data.reshape(-1, channels)
+
+
+def array_to_bytes(data, sample_width=2, unsigned_8bit=False):
+    scale = float(1 << (8 * sample_width - 1))
+    samples = np.clip(np.asarray(data, dtype=np.float64) * scale, -scale, scale - 1)
+    if sample_width == 1 and unsigned_8bit:
+        return (samples + 128.0).astype(np.uint8).tobytes()
+    if sample_width == 3:
+        samples = samples.astype(np.int32).reshape(-1)
+        raw = np.empty((samples.size, 3), dtype=np.uint8)
+        raw[:, 0] = samples & 0xFF
+        raw[:, 1] = (samples >> 8) & 0xFF
+        raw[:, 2] = (samples >> 16) & 0xFF
+        return raw.tobytes()
+    return samples.astype(SAMPLE_DTYPES[sample_width]).tobytes()
+
+
+def segment_to_array(segment):
+    return bytes_to_array(segment.raw_data, segment.channels, segment.sample_width)
+
+
+def array_to_segment(data, frame_rate, sample_width=2):
+    from pydub import AudioSegment
+    data = np.asarray(data)
+    if data.ndim == 1:
+        data = data.reshape(-1, 1)
+    return AudioSegment(data=array_to_bytes(data, sample_width), sample_width=sample_width,
+                        frame_rate=frame_rate, channels=data.shape[1])
+
+
+def find_audio_files(input_dir, recursive=True):
+    found = []
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for file_name in sorted(files):
+            if file_name.lower().endswith(AUDIO_EXTENSIONS):
+                found.append(os.path.join(root, file_name))
+        if not recursive:
+            break
+    return found
+
+
+def file_key(file_path):
+    # Cheap change detection for indexes that are keyed by path.
+    stat = os.stat(file_path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def is_wav(file_path):
+    return file_path.lower().endswith('.wav')
+
+
+def streamable_wav(file_path):
+    # The wave module only reads integer PCM; float and WAVE_FORMAT_EXTENSIBLE
+    # files are rejected with wave.Error and have to be decoded another way.
+    if not is_wav(file_path):
+        return False
+    try:
+        wav_info(file_path)
+        return True
+    except wave.Error:
+        return False
+
+
+def wav_info(file_path):
+    with wave.open(file_path, 'rb') as wav:
+        return wav.getnchannels(), wav.getsampwidth(), wav.getframerate(), wav.getnframes()
+
+
+def iter_wav_blocks(file_path, block_frames=1 << 16, start_frame=0, end_frame=None):
+    # Reads a WAV file block by block so memory use stays bounded by block_frames.
+    with wave.open(file_path, 'rb') as wav:
+        channels = wav.getnchannels()
+        sample_width = wav.getsampwidth()
+        if end_frame is None:
+            end_frame = wav.getnframes()
+        wav.setpos(start_frame)
+        position = start_frame
+        while position < end_frame:
+            raw = wav.readframes(min(block_frames, end_frame - position))
+            if not raw:
+                break
+            block = bytes_to_array(raw, channels, sample_width, unsigned_8bit=True)
+            position += len(block)
+            yield block
+
+
+def iter_array_blocks(data, block_frames=1 << 16):
+    for start in range(0, len(data), block_frames):
+        yield data[start:start + block_frames]
+
+
+def copy_wav_range(src_path, dst_path, start_frame, end_frame, block_frames=1 << 16):
+    # Copies a frame range between WAV files without decoding the samples.
+    with wave.open(src_path, 'rb') as src, wave.open(dst_path, 'wb') as dst:
+        dst.setnchannels(src.getnchannels())
+        dst.setsampwidth(src.getsampwidth())
+        dst.setframerate(src.getframerate())
+        src.setpos(start_frame)
+        remaining = end_frame - start_frame
+        while remaining > 0:
+            raw = src.readframes(min(block_frames, remaining))
+            if not raw:
+                break
+            dst.writeframes(raw)
+            remaining -= len(raw) // (src.getnchannels() * src.getsampwidth())
@@ -0,0 +1,144 @@
+import os
+import glob
+import json
+import uuid
+import hashlib
+from store import SampleStoreWriter, SampleStore
+
+# A project is a small JSON file describing the session (edit history, markers,
+# mixer state) next to a sample store holding the decoded PCM of every segment
+# it refers to. Identical segments, such as repeated history entries, are only
+# stored once. Reopening a project maps the store and only copies samples out
+# of it when a segment is actually used.
+
+PROJECT_VERSION = 1
+SAMPLES_SUFFIX = ".samples"
+
+
+def samples_path(project_path, generation):
+    # Each save writes a new generation of the store and the project file names
+    # it. The store of the open session can stay mapped while it is saved over,
+    # which Windows would not allow if the file were replaced in place.
+    return f"{project_path}.{generation}{SAMPLES_SUFFIX}"
+
+
+def _remove_old_stores(project_path, keep):
+    for path in glob.glob(glob.escape(project_path) + ".*" + SAMPLES_SUFFIX):
+        if os.path.abspath(path) != os.path.abspath(keep):
+            try:
+                os.remove(path)
+            except OSError:
+                # Still mapped by an open session; removed by a later save.
+                pass
+
+
+def segment_key(segment):
+    digest = hashlib.sha1(segment.raw_data)
+    digest.update(f"{segment.frame_rate}:{segment.channels}:{segment.sample_width}".encode("ascii"))
+    return digest.hexdigest()
+
+
+class StoredSegment:
+    def __init__(self, store, key):
+        self.store = store
+        self.key = key
+
+    def load(self):
+        return self.store.read_segment(self.key)
+
+
+def _resolve(value):
+    if isinstance(value, StoredSegment):
+        return value.load()
+    return value
+
+
+class LazySegmentList(list):
+    # Behaves like the plain history lists, but entries restored from a project
+    # are read from the sample store on first access.
+    def __getitem__(self, index):
+        value = list.__getitem__(self, index)
+        if isinstance(index, slice):
+            return [_resolve(item) for item in value]
+        if isinstance(value, StoredSegment):
+            value = value.load()
+            list.__setitem__(self, index, value)
+        return value
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def pop(self, index=-1):
+        return _resolve(list.pop(self, index))
+
+    def raw_items(self):
+        return list.__iter__(self)
+
+
+def _raw_items(container):
+    if hasattr(container, "raw_items"):
+        return container.raw_items()
+    return container.items() if isinstance(container, dict) else iter(container)
+
+
+def save_project(project_path, editor, mixer_state=None, compress=False):
+    keys = {}
+
+    def add(writer, value):
+        # Segments restored from a previous save keep their key without rehashing.
+        if isinstance(value, StoredSegment):
+            if value.key not in writer.blobs:
+                info = value.store.info(value.key)
+                writer.add(value.key, value.store.read_bytes(value.key), info["frame_rate"], info["channels"], info["sample_width"])
+            return value.key
+        key = keys.get(id(value))
+        if key is None:
+            key = segment_key(value)
+            keys[id(value)] = key
+            writer.add_segment(key, value)
+        return key
+
+    generation = uuid.uuid4().hex[:12]
+    store_path = samples_path(project_path, generation)
+    temp_path = store_path + ".tmp"
+    try:
+        with SampleStoreWriter(temp_path, compress=compress) as writer:
+            state = {
+                "version": PROJECT_VERSION,
+                "samples": os.path.basename(store_path),
+                "audio": add(writer, editor.audio) if editor.audio is not None else None,
+                "current_audio_file": editor.current_audio_file,
+                "history": [add(writer, item) for item in _raw_items(editor.history)],
+                "redo_stack": [add(writer, item) for item in _raw_items(editor.redo_stack)],
+                "audio_files": {path: add(writer, item) for path, item in _raw_items(editor.audio_files)},
+                "volume_level": editor.volume_level,
+                "key_points": list(editor.key_points),
+                "effects": [list(effect) for effect in editor.effects],
+                "mixer": mixer_state or {},
+            }
+        os.replace(temp_path, store_path)
+        with open(project_path + ".tmp", "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(project_path + ".tmp", project_path)
+    except Exception:
+        for path in (temp_path, store_path, project_path + ".tmp"):
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    _remove_old_stores(project_path, store_path)
+
+
+def load_project(project_path):
+    with open(project_path) as f:
+        state = json.load(f)
+    if state.get("version") != PROJECT_VERSION:
+        raise ValueError(f"Unsupported project version: {state.get('version')}")
+    store = SampleStore(os.path.join(os.path.dirname(project_path), state["samples"]))
+    state["store"] = store
+    state["audio"] = store.read_segment(state["audio"]) if state["audio"] else None
+    state["history"] = LazySegmentList(StoredSegment(store, key) for key in state["history"])
+    state["redo_stack"] = LazySegmentList(StoredSegment(store, key) for key in state["redo_stack"])
+    state["audio_files"] = {path: StoredSegment(store, key) for path, key in state["audio_files"].items()}
+    state["effects"] = [tuple(effect) for effect in state["effects"]]
+    return state
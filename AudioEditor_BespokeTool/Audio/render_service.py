@@ -0,0 +1,314 @@
+import os
+import json
+import time
+import uuid
+import argparse
+import threading
+import traceback
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from editor import AudioEditor
+
+# Local render service for build machines.
+#
+# Jobs are JSON documents naming an input file, an output file and a chain of
+# AudioEditor operations:
+#
+#   {"input": "in.wav", "output": "out.wav",
+#    "chain": [{"op": "trim_silence"}, {"op": "fade_in", "duration_ms": 500}]}
+#
+# POST /jobs queues a job and returns its id (add ?wait=1 to block until it
+# finishes), GET /jobs/<id> reports its status and GET /metrics reports queue
+# depth, throughput and latency. Jobs run on a pool of long-lived worker
+# processes, each keeping its own decoded-audio cache between jobs. Once
+# max_queue jobs are waiting, new jobs are refused with 503 so clients back off.
+# If a worker dies, for example killed for running out of memory, the jobs in
+# its pool fail and the pool is replaced so the service keeps running.
+
+OPERATIONS = {
+    "trim": "trim",
+    "trim_silence": "trim_silence",
+    "fade_in": "fade_in",
+    "fade_out": "fade_out",
+    "adjust_volume": "adjust_volume",
+    "echo": "add_echo",
+    "reverb": "add_reverb",
+    "pitch_up": "pitch_up",
+    "pitch_down": "pitch_down",
+    "noise_reduction": "noise_reduction",
+    "compression": "apply_compression",
+    "eq": "apply_eq",
+    "high_pass": "high_pass",
+    "low_pass": "low_pass",
+    "render_loop": "render_loop",
+    "pan": "pan",
+    "stereo_width": "stereo_width",
+    "spatialise": "spatialise",
+}
+FINISHED_JOBS_KEPT = 1000
+LATENCY_SAMPLES = 1000
+
+
+class QueueFull(Exception):
+    pass
+
+
+class HeadlessEditor(AudioEditor):
+    # Raises instead of printing, so a failing operation fails the job.
+    def log_error(self, e):
+        raise e
+
+
+def _warm_worker():
+    # Import the processing modules once per worker rather than once per job.
+    import numpy
+    import scipy.signal
+    import pydub
+    import eq
+    import silence
+    import loops
+    import spatial
+
+
+def validate_job(spec):
+    if not isinstance(spec, dict):
+        raise ValueError("Job must be a JSON object")
+    for field in ("input", "output"):
+        if not isinstance(spec.get(field), str):
+            raise ValueError(f"Job needs an '{field}' path")
+    chain = spec.get("chain", [])
+    if not isinstance(chain, list):
+        raise ValueError("'chain' must be a list")
+    for step in chain:
+        if not isinstance(step, dict) or step.get("op") not in OPERATIONS:
+            raise ValueError(f"Unknown operation in chain: {step}")
+
+
+def run_job(spec):
+    started = time.time()
+    editor = HeadlessEditor()
+    editor.audio = editor.cache.get(spec["input"])
+    editor.current_audio_file = spec["input"]
+    editor.history.append(editor.audio)
+    for step in spec.get("chain", []):
+        params = {key: value for key, value in step.items() if key != "op"}
+        getattr(editor, OPERATIONS[step["op"]])(**params)
+    output_dir = os.path.dirname(os.path.abspath(spec["output"]))
+    os.makedirs(output_dir, exist_ok=True)
+    editor.audio.export(spec["output"], format=spec.get("format", "wav"))
+    return {"output": spec["output"], "duration_ms": len(editor.audio), "started": started, "finished": time.time()}
+
+
+class RenderService:
+    def __init__(self, workers=None, max_queue=64):
+        self.workers = workers or os.cpu_count()
+        self.max_queue = max_queue
+        self.pool = self._new_pool()
+        self.restarts = 0
+        self.lock = threading.Lock()
+        self.jobs = OrderedDict()
+        self.outstanding = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.run_times = deque(maxlen=LATENCY_SAMPLES)
+        self.started = time.time()
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker)
+
+    def _replace_pool(self, broken):
+        # Called with the lock held. Returns the broken pool, to be shut down
+        # once the lock is released, or None if it was already replaced.
+        if self.pool is not broken:
+            return None
+        self.pool = self._new_pool()
+        self.restarts += 1
+        return broken
+
+    def submit(self, spec):
+        validate_job(spec)
+        stale = None
+        with self.lock:
+            if self.outstanding >= self.max_queue + self.workers:
+                self.rejected += 1
+                raise QueueFull("Render queue is full")
+            job = {"id": uuid.uuid4().hex, "status": "queued", "submitted": time.time(), "spec": spec, "done": threading.Event()}
+            try:
+                future = self.pool.submit(run_job, spec)
+            except BrokenProcessPool:
+                stale = self._replace_pool(self.pool)
+                future = self.pool.submit(run_job, spec)
+            job["future"] = future
+            job["pool"] = self.pool
+            self.jobs[job["id"]] = job
+            self.outstanding += 1
+        if stale is not None:
+            stale.shutdown(wait=False)
+        future.add_done_callback(lambda future: self._finish(job, future))
+        return job
+
+    def _finish(self, job, future):
+        stale = None
+        with self.lock:
+            self.outstanding -= 1
+            try:
+                result = future.result()
+                job["status"] = "done"
+                job["result"] = {key: result[key] for key in ("output", "duration_ms")}
+                self.completed += 1
+                self.run_times.append(result["finished"] - result["started"])
+            except BrokenProcessPool:
+                job["status"] = "failed"
+                job["error"] = "A render worker process died; the worker pool was restarted"
+                self.failed += 1
+                stale = self._replace_pool(job["pool"])
+            except Exception as e:
+                job["status"] = "failed"
+                job["error"] = "".join(traceback.format_exception_only(type(e), e)).strip()
+                self.failed += 1
+            job["finished"] = time.time()
+            self.latencies.append(job["finished"] - job["submitted"])
+            self._forget_old_jobs()
+        if stale is not None:
+            stale.shutdown(wait=False)
+        job["done"].set()
+
+    def _forget_old_jobs(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job["status"] in ("done", "failed")]
+        for job_id in finished[:max(0, len(finished) - FINISHED_JOBS_KEPT)]:
+            del self.jobs[job_id]
+
+    def status(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        status = job["status"]
+        if status == "queued" and job["future"].running():
+            status = "running"
+        report = {"id": job["id"], "status": status, "input": job["spec"]["input"], "output": job["spec"]["output"]}
+        for key in ("result", "error"):
+            if key in job:
+                report[key] = job[key]
+        if "finished" in job:
+            report["latency_ms"] = round((job["finished"] - job["submitted"]) * 1000, 1)
+        return report
+
+    def metrics(self):
+        with self.lock:
+            running = sum(1 for job in self.jobs.values() if job["status"] == "queued" and job["future"].running())
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "queue_depth": self.outstanding - running,
+                "running": running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "pool_restarts": self.restarts,
+                "uptime_s": round(time.time() - self.started, 1),
+                "latency_ms": _percentiles(self.latencies),
+                "run_time_ms": _percentiles(self.run_times),
+            }
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
+
+
+def _percentiles(samples):
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def at(fraction):
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 1)
+
+    return {"p50": at(0.5), "p95": at(0.95), "max": round(ordered[-1] * 1000, 1)}
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    def _send(self, code, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        service = self.server.service
+        path = urlparse(self.path).path
+        if path == "/metrics":
+            self._send(200, service.metrics())
+        elif path.startswith("/jobs/"):
+            report = service.status(path[len("/jobs/"):])
+            self._send(200 if report else 404, report or {"error": "Unknown job"})
+        else:
+            self._send(404, {"error": "Not found"})
+
+    def do_POST(self):
+        service = self.server.service
+        url = urlparse(self.path)
+        if url.path != "/jobs":
+            self._send(404, {"error": "Not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            job = service.submit(json.loads(self.rfile.read(length) or b"null"))
+        except QueueFull as e:
+            self._send(503, {"error": str(e)}, {"Retry-After": "1"})
+            return
+        except ValueError as e:
+            self._send(400, {"error": str(e)})
+            return
+        except Exception as e:
+            self._send(500, {"error": "".join(traceback.format_exception_only(type(e), e)).strip()})
+            return
+        if parse_qs(url.query).get("wait", ["0"])[0] == "1":
+            job["done"].wait()
+            report = service.status(job["id"])
+            self._send(200 if report["status"] == "done" else 500, report)
+        else:
+            self._send(202, service.status(job["id"]))
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def serve(host="127.0.0.1", port=8765, workers=None, max_queue=64, verbose=False):
+    service = RenderService(workers, max_queue)
+    server = ThreadingHTTPServer((host, port), RenderRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.verbose = verbose
+    print(f"Render service listening on http://{host}:{server.server_address[1]} with {service.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run AudioEditor effect chains as a local render service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-queue", type=int, default=64)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.max_queue, args.verbose)
+
+
+if __name__ == "__main__":
+    main()
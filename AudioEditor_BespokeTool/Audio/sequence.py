@@ -0,0 +1,175 @@
+import json
+import wave
+import argparse
+import numpy as np
+from pcm import segment_to_array, array_to_segment, array_to_bytes
+
+# Sequence assembly: places clips on a timeline at exact frame offsets and
+# renders them with crossfades in a single pass into one preallocated buffer,
+# instead of growing a segment with repeated pydub concatenation. Long
+# timelines can be streamed to a WAV file block by block.
+
+CURVES = {
+    "linear": lambda t: t,
+    "equal_power": lambda t: np.sin(t * np.pi / 2),
+    "s_curve": lambda t: 0.5 - 0.5 * np.cos(t * np.pi),
+}
+
+
+class Clip:
+    def __init__(self, source, start, gain_db=0.0, fade_in=0, fade_out=0, curve="equal_power"):
+        if curve not in CURVES:
+            raise ValueError(f"Unknown crossfade curve: {curve}")
+        self.source = source
+        self.start = start
+        self.gain_db = gain_db
+        self.fade_in = fade_in
+        self.fade_out = fade_out
+        self.curve = curve
+        self.frames = None
+        self.data = None
+
+    @property
+    def end(self):
+        return self.start + self.frames
+
+
+class Sequence:
+    def __init__(self, frame_rate=44100, channels=2, sample_width=2, loader=None):
+        # loader turns a clip source that is not an AudioSegment (a file path) into one.
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.loader = loader or _default_loader
+        self.clips = []
+
+    def to_frames(self, ms):
+        return int(round(ms * self.frame_rate / 1000.0))
+
+    def add(self, source, offset_ms=None, offset_frames=None, crossfade_ms=0, curve="equal_power", gain_db=0.0):
+        # Without an offset the clip starts where the previous clip ends, overlapped
+        # by crossfade_ms. Where the clip overlaps the previous one, the crossfade
+        # fades the previous clip out and this one in over the overlap.
+        crossfade = self.to_frames(crossfade_ms)
+        previous = self.clips[-1] if self.clips else None
+        if offset_frames is None:
+            if offset_ms is not None:
+                offset_frames = self.to_frames(offset_ms)
+            elif previous is not None:
+                offset_frames = max(0, previous.end - crossfade)
+            else:
+                offset_frames = 0
+        clip = Clip(source, offset_frames, gain_db, curve=curve)
+        clip.frames = self._measure(clip)
+        if previous is not None and crossfade and clip.start >= previous.start:
+            overlap = min(crossfade, previous.end - clip.start, clip.frames)
+            if overlap > 0:
+                clip.fade_in = overlap
+                previous.fade_out = max(previous.fade_out, overlap)
+        self.clips.append(clip)
+        return clip
+
+    def _segment(self, clip):
+        return clip.source if hasattr(clip.source, "raw_data") else self.loader(clip.source)
+
+    def _measure(self, clip):
+        # Length at the sequence's frame rate, without converting the samples.
+        segment = self._segment(clip)
+        return int(round(segment.frame_count() * self.frame_rate / segment.frame_rate))
+
+    def _clip_data(self, clip):
+        # The clip's samples with gain and fades applied.
+        if clip.data is None:
+            segment = self._segment(clip).set_frame_rate(self.frame_rate).set_channels(self.channels)
+            data = segment_to_array(segment)
+            # Resampling can be a frame off the measured length; keep the timeline's.
+            if len(data) != clip.frames:
+                fitted = np.zeros((clip.frames, self.channels), dtype=data.dtype)
+                fitted[:min(len(data), clip.frames)] = data[:clip.frames]
+                data = fitted
+            if clip.gain_db:
+                data *= 10 ** (clip.gain_db / 20.0)
+            curve = CURVES[clip.curve]
+            fade_in = min(clip.fade_in, len(data))
+            if fade_in:
+                data[:fade_in] *= curve(np.linspace(0.0, 1.0, fade_in, endpoint=False))[:, None]
+            fade_out = min(clip.fade_out, len(data))
+            if fade_out:
+                data[len(data) - fade_out:] *= curve(np.linspace(1.0, 0.0, fade_out, endpoint=False))[:, None]
+            clip.data = data
+        return clip.data
+
+    def total_frames(self):
+        return max((clip.end for clip in self.clips), default=0)
+
+    def render_array(self):
+        output = np.zeros((self.total_frames(), self.channels), dtype=np.float32)
+        for clip in self.clips:
+            data = self._clip_data(clip)
+            output[clip.start:clip.start + len(data)] += data
+            clip.data = None
+        return output
+
+    def render(self):
+        return array_to_segment(self.render_array(), self.frame_rate, self.sample_width)
+
+    def render_to_file(self, file_path, block_frames=1 << 18):
+        # Renders block by block. Only the clips overlapping the current block are
+        # held in memory, so the output can be far longer than available RAM.
+        total = self.total_frames()
+        clips = sorted(self.clips, key=lambda clip: clip.start)
+        active = []
+        next_clip = 0
+        with wave.open(file_path, "wb") as wav:
+            wav.setnchannels(self.channels)
+            wav.setsampwidth(self.sample_width)
+            wav.setframerate(self.frame_rate)
+            for block_start in range(0, total, block_frames):
+                block_end = min(block_start + block_frames, total)
+                while next_clip < len(clips) and clips[next_clip].start < block_end:
+                    active.append(clips[next_clip])
+                    next_clip += 1
+                block = np.zeros((block_end - block_start, self.channels), dtype=np.float32)
+                for clip in active:
+                    data = self._clip_data(clip)
+                    lo = max(block_start, clip.start)
+                    hi = min(block_end, clip.end)
+                    if hi > lo:
+                        block[lo - block_start:hi - block_start] += data[lo - clip.start:hi - clip.start]
+                for clip in [clip for clip in active if clip.end <= block_end]:
+                    clip.data = None
+                    active.remove(clip)
+                wav.writeframes(array_to_bytes(block, self.sample_width, unsigned_8bit=True))
+        return total
+
+
+def _default_loader(file_path):
+    from cache import default_cache
+    return default_cache().get(file_path)
+
+
+def from_timeline(timeline, loader=None):
+    # timeline: {"frame_rate", "channels", "sample_width", "clips": [{"path", "offset_ms",
+    # "crossfade_ms", "curve", "gain_db"}, ...]}; every clip field except "path" is optional.
+    sequence = Sequence(timeline.get("frame_rate", 44100), timeline.get("channels", 2),
+                        timeline.get("sample_width", 2), loader)
+    for clip in timeline["clips"]:
+        sequence.add(clip["path"], offset_ms=clip.get("offset_ms"), offset_frames=clip.get("offset_frames"),
+                     crossfade_ms=clip.get("crossfade_ms", 0), curve=clip.get("curve", "equal_power"),
+                     gain_db=clip.get("gain_db", 0.0))
+    return sequence
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a clip timeline to a WAV file.")
+    parser.add_argument("timeline", help="JSON file describing the clips")
+    parser.add_argument("output")
+    args = parser.parse_args()
+    with open(args.timeline) as f:
+        sequence = from_timeline(json.load(f))
+    frames = sequence.render_to_file(args.output)
+    print(f"Rendered {len(sequence.clips)} clip(s), {frames / sequence.frame_rate:.2f} s, to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
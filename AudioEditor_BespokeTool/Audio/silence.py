@@ -0,0 +1,169 @@
+import os
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from pcm import streamable_wav, wav_info, iter_wav_blocks, iter_array_blocks, copy_wav_range, segment_to_array, find_audio_files
+
+
+def window_levels(blocks, window_frames, mode='rms'):
+    # Yields the level in dBFS of every window_frames window across all blocks.
+    # Blocks need not line up with windows; the remainder is carried over.
+    carry = None
+    for block in blocks:
+        if carry is not None and len(carry):
+            block = np.concatenate([carry, block])
+        usable = len(block) - len(block) % window_frames
+        carry = block[usable:]
+        if usable:
+            yield _levels_db(block[:usable].reshape(-1, window_frames, block.shape[1]), mode)
+    if carry is not None and len(carry):
+        yield _levels_db(carry.reshape(1, len(carry), carry.shape[1]), mode)
+
+
+def _levels_db(windows, mode):
+    if mode == 'peak':
+        level = np.abs(windows).max(axis=(1, 2))
+    else:
+        level = np.sqrt(np.mean(np.square(windows, dtype=np.float64), axis=(1, 2)))
+    return 20 * np.log10(np.maximum(level, 1e-10))
+
+
+def find_sound_ranges(blocks, frame_rate, total_frames, threshold_db=-50.0, min_silence_ms=500,
+                      window_ms=10, padding_ms=50, mode='rms'):
+    # Returns (start_frame, end_frame) pairs of non-silent audio. Gaps shorter
+    # than min_silence_ms are not treated as silence.
+    window_frames = max(1, int(frame_rate * window_ms / 1000))
+    levels = list(window_levels(blocks, window_frames, mode))
+    if not levels:
+        return []
+    loud = np.concatenate(levels) >= threshold_db
+    edges = np.diff(np.concatenate([[False], loud, [False]]).astype(np.int8))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    if not len(starts):
+        return []
+
+    min_gap = max(1, int(np.ceil(min_silence_ms / window_ms)))
+    keep = (starts[1:] - ends[:-1]) >= min_gap
+    starts = np.concatenate([starts[:1], starts[1:][keep]])
+    ends = np.concatenate([ends[:-1][keep], ends[-1:]])
+
+    padding = int(frame_rate * padding_ms / 1000)
+    starts = np.maximum(starts * window_frames - padding, 0)
+    ends = np.minimum(ends * window_frames + padding, total_frames)
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def trim_bounds(ranges):
+    if not ranges:
+        return None
+    return ranges[0][0], ranges[-1][1]
+
+
+def segment_sound_ranges(segment, block_frames=1 << 16, **options):
+    data = segment_to_array(segment)
+    return find_sound_ranges(iter_array_blocks(data, block_frames), segment.frame_rate, len(data), **options)
+
+
+def wav_sound_ranges(file_path, block_frames=1 << 16, **options):
+    channels, sample_width, frame_rate, frames = wav_info(file_path)
+    return find_sound_ranges(iter_wav_blocks(file_path, block_frames), frame_rate, frames, **options)
+
+
+def trim_segment(segment, **options):
+    bounds = trim_bounds(segment_sound_ranges(segment, **options))
+    if bounds is None:
+        return segment[:0]
+    return segment.get_sample_slice(*bounds)
+
+
+def split_segment(segment, **options):
+    return [segment.get_sample_slice(start, end) for start, end in segment_sound_ranges(segment, **options)]
+
+
+def process_file(file_path, output_dir, split=False, **options):
+    # PCM WAV input is scanned and copied block by block so very long recordings
+    # never have to be held in memory. Other files are decoded with pydub.
+    os.makedirs(output_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    outputs = []
+    if streamable_wav(file_path):
+        ranges = wav_sound_ranges(file_path, **options)
+        if not split:
+            ranges = [bound for bound in [trim_bounds(ranges)] if bound]
+        for index, (start, end) in enumerate(ranges):
+            output_path = os.path.join(output_dir, _output_name(name, index, split))
+            copy_wav_range(file_path, output_path, start, end)
+            outputs.append(output_path)
+    else:
+        from pydub import AudioSegment
+        segment = AudioSegment.from_file(file_path)
+        pieces = split_segment(segment, **options) if split else [trim_segment(segment, **options)]
+        for index, piece in enumerate(pieces):
+            if not len(piece):
+                continue
+            output_path = os.path.join(output_dir, _output_name(name, index, split))
+            piece.export(output_path, format="wav")
+            outputs.append(output_path)
+    return outputs
+
+
+def _output_name(name, index, split):
+    if split:
+        return f"{name}_{index + 1:03d}.wav"
+    return f"{name}.wav"
+
+
+def _process_file_job(file_path, output_dir, split, options):
+    try:
+        return file_path, process_file(file_path, output_dir, split, **options), None
+    except Exception as e:
+        return file_path, [], f"{e}\n{traceback.format_exc()}"
+
+
+def batch_process(input_dir, output_dir, split=False, recursive=True, workers=None, **options):
+    # Trims or splits every audio file under input_dir using one process per core.
+    # The folder layout of input_dir is mirrored in output_dir.
+    results = {}
+    errors = {}
+    files = find_audio_files(input_dir, recursive)
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = []
+        for file_path in files:
+            relative_dir = os.path.dirname(os.path.relpath(file_path, input_dir))
+            futures.append(pool.submit(_process_file_job, file_path, os.path.join(output_dir, relative_dir), split, options))
+        for future in as_completed(futures):
+            file_path, outputs, error = future.result()
+            if error:
+                errors[file_path] = error
+            else:
+                results[file_path] = outputs
+    return results, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trim or split audio files on silence.")
+    parser.add_argument("input_dir")
+    parser.add_argument("output_dir")
+    parser.add_argument("--split", action="store_true", help="split files on silence gaps instead of trimming")
+    parser.add_argument("--threshold-db", type=float, default=-50.0)
+    parser.add_argument("--min-silence-ms", type=int, default=500)
+    parser.add_argument("--padding-ms", type=int, default=50)
+    parser.add_argument("--mode", choices=["rms", "peak"], default="rms")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--no-recursive", action="store_true")
+    args = parser.parse_args()
+
+    results, errors = batch_process(args.input_dir, args.output_dir, split=args.split,
+                                    recursive=not args.no_recursive, workers=args.workers,
+                                    threshold_db=args.threshold_db, min_silence_ms=args.min_silence_ms,
+                                    padding_ms=args.padding_ms, mode=args.mode)
+    for file_path, outputs in sorted(results.items()):
+        print(f"{file_path}: {len(outputs)} file(s) written")
+    for file_path, error in sorted(errors.items()):
+        print(f"Error processing {file_path}: {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+import os
+import json
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy.fft import dct
+from pcm import segment_to_array, find_audio_files, file_key
+
+# Similarity and duplicate index for sound libraries.
+#
+# Every file is reduced to a short fingerprint: MFCC mean and deviation,
+# a chroma profile and a coarse loudness envelope. Fingerprints are L2
+# normalised so a single matrix product gives cosine similarity against the
+# whole library. The index is saved as an .npz of vectors plus a JSON list of
+# paths with their mtime and size, and files whose entry is still current are
+# not decoded again.
+
+N_FFT = 2048
+HOP = 512
+N_MELS = 40
+N_MFCC = 13
+ENVELOPE_POINTS = 32
+MAX_SECONDS = 60
+VECTOR_SIZE = 2 * N_MFCC + 12 + ENVELOPE_POINTS
+# Relative weight of each feature group in the final vector.
+GROUP_WEIGHTS = (1.0, 0.5, 0.5, 0.75)
+
+
+def mel_filterbank(frame_rate, n_fft=N_FFT, n_mels=N_MELS):
+    def to_mel(hz):
+        return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+    def to_hz(mel):
+        return 700.0 * (10 ** (mel / 2595.0) - 1.0)
+
+    bin_freqs = np.fft.rfftfreq(n_fft, 1.0 / frame_rate)
+    edges = to_hz(np.linspace(to_mel(20.0), to_mel(min(frame_rate / 2.0, 16000.0)), n_mels + 2))
+    lower, center, upper = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    rising = (bin_freqs - lower) / (center - lower)
+    falling = (upper - bin_freqs) / (upper - center)
+    return np.maximum(0.0, np.minimum(rising, falling))
+
+
+def chroma_map(frame_rate, n_fft=N_FFT):
+    bin_freqs = np.fft.rfftfreq(n_fft, 1.0 / frame_rate)
+    valid = (bin_freqs >= 55.0) & (bin_freqs <= 5000.0)
+    pitch_class = np.zeros(len(bin_freqs), dtype=np.int64)
+    pitch_class[valid] = np.round(12 * np.log2(bin_freqs[valid] / 440.0) + 69).astype(np.int64) % 12
+    mapping = np.zeros((12, len(bin_freqs)))
+    mapping[pitch_class[valid], np.flatnonzero(valid)] = 1.0
+    return mapping
+
+
+def power_spectrogram(mono):
+    if len(mono) < N_FFT:
+        mono = np.pad(mono, (0, N_FFT - len(mono)))
+    frames = np.lib.stride_tricks.sliding_window_view(mono, N_FFT)[::HOP]
+    return np.abs(np.fft.rfft(frames * np.hanning(N_FFT), axis=1)) ** 2
+
+
+def fingerprint(data, frame_rate):
+    # data is a (frames, channels) float array; returns (vector, duration_seconds).
+    duration = len(data) / float(frame_rate)
+    mono = data[:int(frame_rate * MAX_SECONDS)].mean(axis=1)
+    power = power_spectrogram(mono)
+
+    mel = np.log(power @ mel_filterbank(frame_rate).T + 1e-10)
+    mfcc = dct(mel, type=2, axis=1, norm='ortho')[:, :N_MFCC]
+    chroma = (power @ chroma_map(frame_rate).T).mean(axis=0)
+    rms = np.sqrt(power.mean(axis=1))
+    envelope = np.interp(np.linspace(0, len(rms) - 1, ENVELOPE_POINTS), np.arange(len(rms)), rms)
+
+    groups = (mfcc.mean(axis=0), mfcc.std(axis=0), chroma, envelope / (envelope.max() + 1e-10))
+    vector = np.concatenate([weight * group / (np.linalg.norm(group) + 1e-10)
+                             for weight, group in zip(GROUP_WEIGHTS, groups)])
+    return (vector / (np.linalg.norm(vector) + 1e-10)).astype(np.float32), duration
+
+
+def fingerprint_segment(segment):
+    return fingerprint(segment_to_array(segment), segment.frame_rate)
+
+
+def _fingerprint_file_job(file_path):
+    from cache import decode_file
+    try:
+        key = file_key(file_path)
+        vector, duration = fingerprint_segment(decode_file(file_path))
+        return file_path, key, vector, duration, None
+    except Exception as e:
+        return file_path, None, None, None, f"{e}\n{traceback.format_exc()}"
+
+
+def query_audio(index, file_path=None, segment=None, k=10):
+    # Sounds like the file at file_path, or like segment when there is no such file.
+    if file_path and os.path.isfile(file_path):
+        return index.query(file_path, k)
+    if segment:
+        vector, duration = fingerprint_segment(segment)
+        return index.query(vector, k)
+    return []
+
+
+class SimilarityIndex:
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        self.paths = []
+        self.keys = []
+        self.vectors = np.zeros((0, VECTOR_SIZE), dtype=np.float32)
+        self.durations = np.zeros(0)
+        self.positions = {}
+        self.load()
+
+    def _files(self):
+        return os.path.join(self.index_dir, "index.json"), os.path.join(self.index_dir, "vectors.npz")
+
+    def load(self):
+        meta_path, vectors_path = self._files()
+        if not (os.path.exists(meta_path) and os.path.exists(vectors_path)):
+            return
+        with open(meta_path) as f:
+            meta = json.load(f)
+        arrays = np.load(vectors_path)
+        if arrays["vectors"].shape[1:] != (VECTOR_SIZE,):
+            return
+        self.paths = meta["paths"]
+        self.keys = meta["keys"]
+        self.vectors = arrays["vectors"]
+        self.durations = arrays["durations"]
+        self.positions = {path: i for i, path in enumerate(self.paths)}
+
+    def save(self):
+        os.makedirs(self.index_dir, exist_ok=True)
+        meta_path, vectors_path = self._files()
+        np.savez(vectors_path + ".tmp.npz", vectors=self.vectors, durations=self.durations)
+        os.replace(vectors_path + ".tmp.npz", vectors_path)
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump({"paths": self.paths, "keys": self.keys}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __contains__(self, file_path):
+        return os.path.abspath(file_path) in self.positions
+
+    def is_current(self, file_path):
+        position = self.positions.get(file_path)
+        try:
+            return position is not None and self.keys[position] == file_key(file_path)
+        except OSError:
+            return False
+
+    def update(self, file_paths, workers=None, save=True):
+        # Fingerprints files that are new or changed since they were indexed.
+        # Returns (number added, errors by path).
+        file_paths = [os.path.abspath(path) for path in file_paths]
+        pending = [path for path in dict.fromkeys(file_paths) if not self.is_current(path)]
+        errors = {}
+        results = []
+        if pending:
+            with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+                chunksize = max(1, len(pending) // (4 * (workers or os.cpu_count())))
+                for file_path, key, vector, duration, error in pool.map(_fingerprint_file_job, pending, chunksize=chunksize):
+                    if error:
+                        errors[file_path] = error
+                    else:
+                        results.append((file_path, key, vector, duration))
+        if results:
+            self._store(results)
+            if save:
+                self.save()
+        return len(results), errors
+
+    def _store(self, results):
+        vectors = list(self.vectors)
+        durations = list(self.durations)
+        for file_path, key, vector, duration in results:
+            position = self.positions.get(file_path)
+            if position is None:
+                self.positions[file_path] = len(self.paths)
+                self.paths.append(file_path)
+                self.keys.append(key)
+                vectors.append(vector)
+                durations.append(duration)
+            else:
+                self.keys[position] = key
+                vectors[position] = vector
+                durations[position] = duration
+        self.vectors = np.array(vectors, dtype=np.float32).reshape(-1, VECTOR_SIZE)
+        self.durations = np.array(durations)
+
+    def prune(self, save=True):
+        # Drops entries for files that no longer exist.
+        keep = [i for i, path in enumerate(self.paths) if os.path.exists(path)]
+        if len(keep) == len(self.paths):
+            return 0
+        removed = len(self.paths) - len(keep)
+        self.paths = [self.paths[i] for i in keep]
+        self.keys = [self.keys[i] for i in keep]
+        self.vectors = self.vectors[keep]
+        self.durations = self.durations[keep]
+        self.positions = {path: i for i, path in enumerate(self.paths)}
+        if save:
+            self.save()
+        return removed
+
+    def vector_for(self, file_path):
+        file_path = os.path.abspath(file_path)
+        if self.is_current(file_path):
+            return self.vectors[self.positions[file_path]]
+        from cache import decode_file
+        return fingerprint_segment(decode_file(file_path))[0]
+
+    def query(self, query, k=10):
+        # query is a file path or a fingerprint vector. Returns [(path, similarity)] best first.
+        if not len(self.paths):
+            return []
+        exclude = None
+        if isinstance(query, str):
+            exclude = self.positions.get(os.path.abspath(query))
+            query = self.vector_for(query)
+        scores = self.vectors @ query
+        if exclude is not None:
+            scores[exclude] = -np.inf
+        k = min(k, len(scores) - (exclude is not None))
+        if k <= 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(self.paths[i], float(scores[i])) for i in best]
+
+    def duplicates(self, threshold=0.995, duration_tolerance=0.02, block_rows=1024):
+        # Groups files whose fingerprints are nearly identical and whose lengths match.
+        parent = list(range(len(self.paths)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for start in range(0, len(self.paths), block_rows):
+            scores = self.vectors[start:start + block_rows] @ self.vectors.T
+            rows, cols = np.nonzero(scores >= threshold)
+            rows += start
+            mask = cols > rows
+            rows, cols = rows[mask], cols[mask]
+            lengths = np.maximum(self.durations[rows], self.durations[cols])
+            close = np.abs(self.durations[rows] - self.durations[cols]) <= duration_tolerance * np.maximum(lengths, 1e-3)
+            for i, j in zip(rows[close], cols[close]):
+                parent[find(i)] = find(j)
+
+        groups = {}
+        for i in range(len(self.paths)):
+            groups.setdefault(find(i), []).append(self.paths[i])
+        return sorted((sorted(group) for group in groups.values() if len(group) > 1), key=lambda group: group[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find similar and duplicate sounds.")
+    parser.add_argument("index_dir")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="add or refresh folders in the index")
+    build.add_argument("folders", nargs="+")
+    build.add_argument("--workers", type=int, default=None)
+    query = commands.add_parser("query", help="list the sounds most similar to a file")
+    query.add_argument("file")
+    query.add_argument("-k", type=int, default=10)
+    dupes = commands.add_parser("dupes", help="report groups of near-duplicate files")
+    dupes.add_argument("--threshold", type=float, default=0.995)
+    args = parser.parse_args()
+
+    index = SimilarityIndex(args.index_dir)
+    if args.command == "build":
+        files = [path for folder in args.folders for path in find_audio_files(folder)]
+        index.prune(save=False)
+        added, errors = index.update(files, workers=args.workers)
+        index.save()
+        print(f"{added} file(s) fingerprinted, {len(index)} in index")
+        for file_path, error in sorted(errors.items()):
+            print(f"Error processing {file_path}: {error}")
+    elif args.command == "query":
+        for file_path, score in index.query(args.file, args.k):
+            print(f"{score:.4f}  {file_path}")
+    else:
+        for group in index.duplicates(args.threshold):
+            print("\n".join(group))
+            print()
+
+
+if __name__ == "__main__":
+    main()
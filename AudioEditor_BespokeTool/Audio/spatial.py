@@ -0,0 +1,208 @@
+import os
+import re
+import argparse
+import functools
+import traceback
+from math import gcd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from scipy.fft import rfft, irfft
+from scipy.signal import resample_poly
+from pcm import segment_to_array, array_to_segment, find_audio_files
+
+# Panning and spatialisation for positional game audio.
+#
+# pan() is an equal-power pan of mono sources and an equal-power balance of
+# stereo ones, and stereo_width() scales the side signal. For binaural
+# rendering, an HRTF set is a folder of two-channel (left ear, right ear)
+# impulse responses, one per azimuth; the last number in each file name is
+# its azimuth in degrees, 0 ahead and 90 to the right. Sources are convolved
+# with the nearest impulse response by uniformly partitioned overlap-save
+# convolution: every input block is transformed in one batched FFT and each IR
+# partition is applied to all blocks at once. IR spectra are cached per
+# process, so rendering many sounds or positions transforms each IR once.
+
+DEFAULT_BLOCK = 1024
+
+
+def pan(data, position):
+    # position runs from -1 (hard left) through 0 (centre) to 1 (hard right).
+    position = min(1.0, max(-1.0, position))
+    angle = (position + 1) * np.pi / 4
+    data = np.asarray(data, dtype=np.float32)
+    if data.shape[1] == 1:
+        return data * np.array([np.cos(angle), np.sin(angle)], dtype=np.float32)
+    # Stereo keeps both channels at unity in the centre and fades the far side out.
+    gains = np.minimum(1.0, np.sqrt(2) * np.array([np.cos(angle), np.sin(angle)]))
+    return data[:, :2] * gains.astype(np.float32)
+
+
+def stereo_width(data, width):
+    # 0 collapses to mono, 1 leaves the audio unchanged and above 1 widens it.
+    data = np.asarray(data, dtype=np.float32)
+    if data.shape[1] == 1:
+        return np.repeat(data, 2, axis=1)
+    mid = (data[:, 0] + data[:, 1]) / 2
+    side = (data[:, 0] - data[:, 1]) / 2 * width
+    return np.stack([mid + side, mid - side], axis=1)
+
+
+def azimuth_position(azimuth):
+    # Pan position for an azimuth in degrees; sounds behind mirror those in front.
+    return float(np.sin(np.radians(azimuth)))
+
+
+def ir_spectra(ir, block=DEFAULT_BLOCK):
+    # Splits a (frames, 2) impulse response into block-sized partitions and
+    # returns their spectra shaped (partitions, 2, block + 1).
+    partitions = -(-len(ir) // block)
+    padded = np.zeros((partitions * block, 2), dtype=np.float32)
+    padded[:len(ir)] = ir
+    parts = padded.reshape(partitions, block, 2).transpose(0, 2, 1)
+    return rfft(parts, 2 * block, axis=2)
+
+
+def convolve_partitioned(mono, spectra, ir_length, block=DEFAULT_BLOCK):
+    # Convolves a mono signal with a two-channel IR given as ir_spectra().
+    length = len(mono) + ir_length - 1
+    blocks = -(-length // block)
+    padded = np.zeros((blocks + 1) * block, dtype=np.float32)
+    padded[block:block + len(mono)] = mono
+    segments = np.lib.stride_tricks.sliding_window_view(padded, 2 * block)[::block][:blocks]
+    inputs = rfft(segments, axis=1)[:, None, :]
+    output = np.zeros((blocks, 2, block + 1), dtype=np.result_type(inputs, spectra))
+    for partition in range(min(len(spectra), blocks)):
+        output[partition:] += inputs[:blocks - partition] * spectra[partition]
+    result = irfft(output, 2 * block, axis=2)[:, :, block:]
+    return result.transpose(0, 2, 1).reshape(-1, 2)[:length]
+
+
+class HrtfSet:
+    def __init__(self, folder):
+        self.folder = folder
+        self.files = []
+        for file_path in find_audio_files(folder):
+            numbers = re.findall(r"-?\d+(?:\.\d+)?", os.path.splitext(os.path.basename(file_path))[0])
+            if numbers:
+                self.files.append((float(numbers[-1]) % 360, file_path))
+        if not self.files:
+            raise ValueError(f"No impulse responses found in {folder}")
+        self.files.sort()
+
+    def nearest(self, azimuth):
+        azimuth = azimuth % 360
+        return min(self.files, key=lambda item: min(abs(item[0] - azimuth), 360 - abs(item[0] - azimuth)))[1]
+
+    def spectra(self, azimuth, frame_rate, block=DEFAULT_BLOCK):
+        # Returns (spectra, ir_length) for the IR nearest to azimuth.
+        file_path = self.nearest(azimuth)
+        return _load_ir(file_path, os.stat(file_path).st_mtime_ns, frame_rate, block)
+
+
+@functools.lru_cache(maxsize=512)
+def _load_ir(file_path, mtime_ns, frame_rate, block):
+    from cache import decode_file
+    segment = decode_file(file_path)
+    if segment.channels != 2:
+        raise ValueError(f"{file_path} must have two channels, left ear and right ear")
+    ir = segment_to_array(segment)
+    if segment.frame_rate != frame_rate:
+        divisor = gcd(segment.frame_rate, frame_rate)
+        ir = resample_poly(ir, frame_rate // divisor, segment.frame_rate // divisor, axis=0).astype(np.float32)
+    return ir_spectra(ir, block), len(ir)
+
+
+@functools.lru_cache(maxsize=8)
+def load_hrtf(folder):
+    return HrtfSet(folder)
+
+
+def spatialise(data, frame_rate, azimuth, hrtf=None, block=DEFAULT_BLOCK):
+    # Binaural render when an HrtfSet is given, otherwise an equal-power pan.
+    data = np.asarray(data, dtype=np.float32)
+    if hrtf is None:
+        return pan(data.mean(axis=1, keepdims=True), azimuth_position(azimuth))
+    spectra, ir_length = hrtf.spectra(azimuth, frame_rate, block)
+    return convolve_partitioned(data.mean(axis=1), spectra, ir_length, block)
+
+
+def pan_segment(segment, position):
+    return array_to_segment(pan(segment_to_array(segment), position), segment.frame_rate, segment.sample_width)
+
+
+def width_segment(segment, width):
+    return array_to_segment(stereo_width(segment_to_array(segment), width), segment.frame_rate, segment.sample_width)
+
+
+def spatialise_segment(segment, azimuth, hrtf_dir=None):
+    hrtf = load_hrtf(hrtf_dir) if hrtf_dir else None
+    data = spatialise(segment_to_array(segment), segment.frame_rate, azimuth, hrtf)
+    return array_to_segment(data, segment.frame_rate, segment.sample_width)
+
+
+_batch_source = None
+
+
+def _init_batch_worker(source_path, hrtf_dir):
+    # Each worker decodes the source and loads the HRTF set once for all its positions.
+    global _batch_source
+    from cache import decode_file
+    segment = decode_file(source_path)
+    _batch_source = (segment_to_array(segment), segment.frame_rate, segment.sample_width,
+                     load_hrtf(hrtf_dir) if hrtf_dir else None)
+
+
+def _render_position_job(azimuth, output_path, block):
+    try:
+        data, frame_rate, sample_width, hrtf = _batch_source
+        array_to_segment(spatialise(data, frame_rate, azimuth, hrtf, block), frame_rate, sample_width).export(output_path, format="wav")
+        return azimuth, output_path, None
+    except Exception as e:
+        return azimuth, output_path, f"{e}\n{traceback.format_exc()}"
+
+
+def position_path(source_path, output_dir, azimuth):
+    name = os.path.splitext(os.path.basename(source_path))[0]
+    return os.path.join(output_dir, f"{name}_az{azimuth:g}.wav")
+
+
+def render_positions(source_path, output_dir, azimuths, hrtf_dir=None, workers=None, block=DEFAULT_BLOCK):
+    # Renders source_path at every azimuth. Returns (output paths by azimuth, errors by azimuth).
+    os.makedirs(output_dir, exist_ok=True)
+    results = {}
+    errors = {}
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_batch_worker,
+                             initargs=(source_path, hrtf_dir)) as pool:
+        futures = [pool.submit(_render_position_job, azimuth, position_path(source_path, output_dir, azimuth), block)
+                   for azimuth in azimuths]
+        for future in as_completed(futures):
+            azimuth, output_path, error = future.result()
+            if error:
+                errors[azimuth] = error
+            else:
+                results[azimuth] = output_path
+    return results, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a sound at many positions around the listener.")
+    parser.add_argument("source")
+    parser.add_argument("output_dir")
+    parser.add_argument("--azimuths", type=float, nargs="+", help="azimuths in degrees, 0 ahead and 90 to the right")
+    parser.add_argument("--step", type=float, default=30, help="render every STEP degrees when --azimuths is not given")
+    parser.add_argument("--hrtf-dir", default=None, help="folder of two-channel impulse responses; without it sounds are panned")
+    parser.add_argument("--block", type=int, default=DEFAULT_BLOCK)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    azimuths = args.azimuths or list(np.arange(-180, 180, args.step))
+    results, errors = render_positions(args.source, args.output_dir, [float(azimuth) for azimuth in azimuths],
+                                       args.hrtf_dir, args.workers, args.block)
+    for azimuth, output_path in sorted(results.items()):
+        print(f"{azimuth:g} degrees -> {output_path}")
+    for azimuth, error in sorted(errors.items()):
+        print(f"Error rendering {azimuth:g} degrees: {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import os
+import sys
+import time
+import importlib
+
+# Startup timing and deferred imports.
+#
+# mark() records how long after launch each startup step finished. Modules
+# wrapped in LazyModule are only imported when first used, and the time spent
+# importing them is recorded too. Set AUDIO_EDITOR_STARTUP_TIMINGS=1 to print
+# the timings once the window has painted.
+
+START = time.perf_counter()
+timings = []
+import_timings = []
+
+
+def mark(label):
+    timings.append((label, time.perf_counter() - START))
+
+
+def enabled():
+    return os.environ.get("AUDIO_EDITOR_STARTUP_TIMINGS") == "1"
+
+
+class LazyModule:
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            already_loaded = self._name in sys.modules
+            start = time.perf_counter()
+            self._module = importlib.import_module(self._name)
+            if not already_loaded:
+                import_timings.append((self._name, time.perf_counter() - start))
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+
+def lazy_import(name):
+    return LazyModule(name)
+
+
+def report():
+    lines = [f"{label:<24} {seconds * 1000:8.1f} ms" for label, seconds in timings]
+    lines += [f"import {name:<17} {seconds * 1000:8.1f} ms" for name, seconds in import_timings]
+    return "\n".join(lines)
@@ -0,0 +1,159 @@
+import os
+import mmap
+import json
+import zlib
+import struct
+
+# Chunked binary store for decoded PCM.
+#
+# Layout: an 8 byte magic, then the sample chunks of every blob, each chunk
+# aligned to CHUNK_ALIGN bytes, then a JSON index and a fixed size footer
+# holding the index offset and length. Uncompressed chunks of one blob are
+# written back to back, so the blob can be read straight out of a memory map.
+
+MAGIC = b"ASMPSTR1"
+FOOTER = struct.Struct("<QQ8s")
+CHUNK_ALIGN = 64
+DEFAULT_CHUNK_BYTES = 1 << 20
+
+
+class SampleStoreWriter:
+    def __init__(self, file_path, chunk_bytes=DEFAULT_CHUNK_BYTES, compress=False, compress_level=1):
+        self.file_path = file_path
+        self.chunk_bytes = chunk_bytes
+        self.compress = compress
+        self.compress_level = compress_level
+        self.blobs = {}
+        self.file = open(file_path, "wb")
+        self.file.write(MAGIC)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def add_segment(self, key, segment):
+        self.add(key, segment.raw_data, segment.frame_rate, segment.channels, segment.sample_width)
+
+    def add(self, key, raw_data, frame_rate, channels, sample_width):
+        if key in self.blobs:
+            return
+        view = memoryview(raw_data).cast("B")
+        frame_bytes = channels * sample_width
+        chunk_bytes = max(frame_bytes, self.chunk_bytes - self.chunk_bytes % frame_bytes)
+        chunks = []
+        for start in range(0, len(view), chunk_bytes):
+            chunk = view[start:start + chunk_bytes]
+            codec = "raw"
+            if self.compress:
+                packed = zlib.compress(chunk, self.compress_level)
+                if len(packed) < len(chunk):
+                    chunk, codec = packed, "zlib"
+            # Only the first chunk is aligned so raw chunks stay contiguous.
+            offset = self._tell(align=not chunks)
+            self.file.write(chunk)
+            chunks.append([offset, len(chunk), min(chunk_bytes, len(view) - start), codec])
+        self.blobs[key] = {
+            "frame_rate": frame_rate,
+            "channels": channels,
+            "sample_width": sample_width,
+            "frames": len(view) // frame_bytes,
+            "chunks": chunks,
+        }
+
+    def _tell(self, align):
+        offset = self.file.tell()
+        if align and offset % CHUNK_ALIGN:
+            self.file.write(b"\0" * (CHUNK_ALIGN - offset % CHUNK_ALIGN))
+            offset = self.file.tell()
+        return offset
+
+    def close(self):
+        if self.file.closed:
+            return
+        index = json.dumps({"blobs": self.blobs}).encode("utf-8")
+        index_offset = self.file.tell()
+        self.file.write(index)
+        self.file.write(FOOTER.pack(index_offset, len(index), MAGIC))
+        self.file.close()
+
+
+class SampleStore:
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.file = open(file_path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        if size < len(MAGIC) + FOOTER.size or self.file.read(len(MAGIC)) != MAGIC:
+            self.file.close()
+            raise ValueError(f"{file_path} is not a sample store")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        index_offset, index_length, magic = FOOTER.unpack(self.map[size - FOOTER.size:])
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{file_path} is truncated")
+        self.blobs = json.loads(self.map[index_offset:index_offset + index_length].decode("utf-8"))["blobs"]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def __contains__(self, key):
+        return key in self.blobs
+
+    def keys(self):
+        return self.blobs.keys()
+
+    def info(self, key):
+        return self.blobs[key]
+
+    def _contiguous_range(self, key):
+        chunks = self.blobs[key]["chunks"]
+        if not chunks:
+            return 0, 0
+        if all(codec == "raw" for _, _, _, codec in chunks):
+            start = chunks[0][0]
+            end = chunks[-1][0] + chunks[-1][1]
+            if end - start == sum(length for _, length, _, _ in chunks):
+                return start, end
+        return None
+
+    def read_bytes(self, key):
+        contiguous = self._contiguous_range(key)
+        if contiguous is not None:
+            return self.map[contiguous[0]:contiguous[1]]
+        parts = []
+        for offset, length, raw_length, codec in self.blobs[key]["chunks"]:
+            data = self.map[offset:offset + length]
+            parts.append(zlib.decompress(data) if codec == "zlib" else data)
+        return b"".join(parts)
+
+    def read_array(self, key):
+        # Integer samples shaped (frames, channels) for 8, 16 and 32 bit audio. For
+        # uncompressed blobs this is a view onto the memory map and nothing is copied.
+        import numpy as np
+        from pcm import SAMPLE_DTYPES
+        info = self.blobs[key]
+        contiguous = self._contiguous_range(key)
+        if contiguous is not None:
+            samples = np.frombuffer(self.map, dtype=SAMPLE_DTYPES[info["sample_width"]],
+                                    count=(contiguous[1] - contiguous[0]) // info["sample_width"], offset=contiguous[0])
+        else:
+            samples = np.frombuffer(self.read_bytes(key), dtype=SAMPLE_DTYPES[info["sample_width"]])
+        return samples.reshape(-1, info["channels"])
+
+    def read_segment(self, key):
+        from pydub import AudioSegment
+        info = self.blobs[key]
+        return AudioSegment(data=self.read_bytes(key), sample_width=info["sample_width"],
+                            frame_rate=info["frame_rate"], channels=info["channels"])
+
+    def close(self):
+        try:
+            self.map.close()
+        except BufferError:
+            # Arrays from read_array still reference the map; it is released with them.
+            pass
+        self.file.close()
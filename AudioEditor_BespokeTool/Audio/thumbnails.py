@@ -0,0 +1,189 @@
+import os
+import json
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from pcm import streamable_wav, wav_info, iter_wav_blocks, iter_array_blocks, segment_to_array, find_audio_files, file_key
+
+# Waveform thumbnails for browsing large sound libraries.
+#
+# A thumbnail is the minimum and maximum sample level in each of `bins` equal
+# slices of a file, stored as int8 (bins, 2), so a few hundred bytes per file.
+# Thumbnails are stored on disk by content hash, so renamed or copied files
+# reuse them. index.json remembers the hash of each path with its modification
+# time and size, so browsing a folder whose thumbnails are already cached only
+# needs a stat() per file. Missing thumbnails are computed in worker
+# processes; PCM WAV files are streamed rather than decoded whole.
+
+THUMBNAIL_BINS = 256
+INDEX_FILE = "index.json"
+
+
+def default_thumbnail_dir():
+    return os.environ.get("AUDIO_EDITOR_THUMBNAIL_DIR") or os.path.join(os.path.expanduser("~"), ".audio_editor", "thumbnails")
+
+
+def compute_peaks(blocks, total_frames, bins=THUMBNAIL_BINS):
+    lows = np.zeros(bins, dtype=np.float32)
+    highs = np.zeros(bins, dtype=np.float32)
+    position = 0
+    for block in blocks:
+        if not len(block):
+            continue
+        ids = (np.arange(position, position + len(block)) * bins) // max(total_frames, 1)
+        ids = np.minimum(ids, bins - 1)
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(ids)) + 1])
+        targets = ids[starts]
+        np.minimum.at(lows, targets, np.minimum.reduceat(block.min(axis=1), starts))
+        np.maximum.at(highs, targets, np.maximum.reduceat(block.max(axis=1), starts))
+        position += len(block)
+    peaks = np.stack([lows, highs], axis=1)
+    return np.clip(np.round(peaks * 127), -127, 127).astype(np.int8)
+
+
+def file_peaks(file_path, bins=THUMBNAIL_BINS):
+    if streamable_wav(file_path):
+        frames = wav_info(file_path)[3]
+        return compute_peaks(iter_wav_blocks(file_path), frames, bins)
+    from cache import decode_file
+    data = segment_to_array(decode_file(file_path))
+    return compute_peaks(iter_array_blocks(data), len(data), bins)
+
+
+def _thumbnail_job(file_path, bins):
+    from cache import file_hash
+    try:
+        key = file_key(file_path)
+        return file_path, key, file_hash(file_path), file_peaks(file_path, bins), None
+    except Exception as e:
+        return file_path, None, None, None, f"{e}\n{traceback.format_exc()}"
+
+
+class ThumbnailCache:
+    def __init__(self, cache_dir=None, bins=THUMBNAIL_BINS):
+        self.cache_dir = cache_dir or default_thumbnail_dir()
+        self.bins = bins
+        self.hashes = {}
+        self.loaded = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(os.path.join(self.cache_dir, INDEX_FILE)) as f:
+                self.hashes = json.load(f)
+        except (OSError, ValueError):
+            self.hashes = {}
+
+    def save(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        index_path = os.path.join(self.cache_dir, INDEX_FILE)
+        with open(index_path + ".tmp", "w") as f:
+            json.dump(self.hashes, f)
+        os.replace(index_path + ".tmp", index_path)
+
+    def _path(self, digest):
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}-{self.bins}.npy")
+
+    def _digest(self, file_path):
+        entry = self.hashes.get(os.path.abspath(file_path))
+        try:
+            if entry is not None and entry[:2] == file_key(file_path):
+                return entry[2]
+        except OSError:
+            pass
+        return None
+
+    def get(self, file_path):
+        # The cached thumbnail, or None if it has not been computed or the file changed.
+        digest = self._digest(file_path)
+        if digest is None:
+            return None
+        peaks = self.loaded.get(digest)
+        if peaks is None:
+            try:
+                peaks = self.loaded[digest] = np.load(self._path(digest))
+            except (OSError, ValueError):
+                return None
+        return peaks
+
+    def missing(self, file_paths):
+        return [path for path in file_paths if self.get(path) is None]
+
+    def _store(self, file_path, key, digest, peaks):
+        thumbnail_path = self._path(digest)
+        if not os.path.exists(thumbnail_path):
+            os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+            np.save(thumbnail_path + ".tmp.npy", peaks)
+            os.replace(thumbnail_path + ".tmp.npy", thumbnail_path)
+        self.hashes[os.path.abspath(file_path)] = key + [digest]
+        self.loaded[digest] = peaks
+
+    def iter_update(self, file_paths, workers=None):
+        # Computes missing thumbnails in worker processes, yielding
+        # (path, peaks, error) as each file finishes. The index is saved at the end.
+        pending = self.missing(dict.fromkeys(file_paths))
+        if not pending:
+            return
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            futures = [pool.submit(_thumbnail_job, file_path, self.bins) for file_path in pending]
+            try:
+                for future in as_completed(futures):
+                    file_path, key, digest, peaks, error = future.result()
+                    if error is None:
+                        self._store(file_path, key, digest, peaks)
+                    yield file_path, peaks, error
+            finally:
+                # Closing the generator early cancels the files not started yet.
+                for future in futures:
+                    future.cancel()
+                self.save()
+
+    def update(self, file_paths, workers=None):
+        # Returns (number computed, errors by path).
+        computed = 0
+        errors = {}
+        for file_path, peaks, error in self.iter_update(file_paths, workers):
+            if error:
+                errors[file_path] = error
+            else:
+                computed += 1
+        return computed, errors
+
+    def prune(self):
+        # Forgets paths that no longer exist and deletes thumbnails nothing refers to.
+        self.hashes = {path: entry for path, entry in self.hashes.items() if os.path.exists(path)}
+        referenced = {self._path(entry[2]) for entry in self.hashes.values()}
+        removed = 0
+        for root, dirs, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                if name.endswith(".npy") and path not in referenced:
+                    os.remove(path)
+                    removed += 1
+        self.loaded.clear()
+        self.save()
+        return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute waveform thumbnails for sound library folders.")
+    parser.add_argument("folders", nargs="+")
+    parser.add_argument("--cache-dir", default=None)
+    parser.add_argument("--bins", type=int, default=THUMBNAIL_BINS)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--prune", action="store_true", help="also delete thumbnails of files that no longer exist")
+    args = parser.parse_args()
+
+    thumbnails = ThumbnailCache(args.cache_dir, args.bins)
+    file_paths = [path for folder in args.folders for path in find_audio_files(folder)]
+    computed, errors = thumbnails.update(file_paths, args.workers)
+    print(f"{computed} thumbnail(s) computed, {len(file_paths) - computed - len(errors)} already cached")
+    for file_path, error in sorted(errors.items()):
+        print(f"Error processing {file_path}: {error}")
+    if args.prune:
+        print(f"{thumbnails.prune()} unused thumbnail(s) removed")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,12 @@
 from PyQt5.QtWidgets import (QMainWindow, QPushButton, QLabel, QFileDialog,
                              QVBoxLayout, QHBoxLayout, QWidget, QSlider, QLineEdit, QGridLayout,
-                             QComboBox, QTabWidget, QListWidget, QListWidgetItem, QToolTip, QMessageBox)
-from PyQt5.QtCore import Qt, pyqtSignal, QTimer
+                             QComboBox, QTabWidget, QListWidget, QListWidgetItem, QToolTip, QMessageBox,
+                             QProgressBar)
+from PyQt5.QtCore import Qt, QSize, pyqtSignal, QTimer
 from PyQt5.QtGui import QPixmap, QFont, QIcon
-import pyqtgraph as pg
+from startup import lazy_import
+
+pg = lazy_import("pyqtgraph")
 
 class AudioEditorUI(QMainWindow):
     key_point_added = pyqtSignal(int)
@@ -65,10 +68,40 @@ class AudioEditorUI(QMainWindow):
         self.tab_widget = QTabWidget()
         self.setCentralWidget(self.tab_widget)
 
+        # Only the main tab is built up front. The other tabs are built the first
+        # time they are shown, and the waveform view right after the first paint.
+        self.lazy_tabs = {}
         self.setup_main_tab()
-        self.setup_mixer_tab()
-        self.setup_history_tab()
-        self.setup_sound_banks_tab()
+        self.mixer_tab = self.add_lazy_tab("Mixer", self.setup_mixer_tab)
+        self.history_tab = self.add_lazy_tab("History", self.setup_history_tab)
+        self.sound_banks_tab = self.add_lazy_tab("Sound Banks", self.setup_sound_banks_tab)
+        self.tab_widget.currentChanged.connect(self.on_tab_changed)
+
+    def add_lazy_tab(self, title, setup):
+        tab = QWidget()
+        self.tab_widget.addTab(tab, title)
+        self.lazy_tabs[tab] = setup
+        return tab
+
+    def ensure_tab(self, tab):
+        setup = self.lazy_tabs.pop(tab, None)
+        if setup:
+            setup()
+
+    def on_tab_changed(self, index):
+        self.ensure_tab(self.tab_widget.widget(index))
+
+    def ensure_waveform_view(self):
+        if self.plot_widget is not None:
+            return
+        # Using PyQtGraph for interactive waveform visualization and markers
+        self.plot_widget = pg.PlotWidget()
+        self.waveform_layout.addWidget(self.plot_widget)
+
+        self.waveform_plot = self.plot_widget.plot(pen="w")
+        self.playhead_line = pg.InfiniteLine(pos=0, angle=90, pen='y')
+        self.plot_widget.addItem(self.playhead_line)
+        self.plot_widget.scene().sigMouseClicked.connect(self.add_key_point)
 
     def setup_main_tab(self):
         self.main_tab = QWidget()
@@ -79,13 +112,12 @@ class AudioEditorUI(QMainWindow):
         self.main_tab.setLayout(self.main_layout)
         self.main_layout.addLayout(self.control_layout)
 
-        # Using PyQtGraph for interactive waveform visualization and markers
-        self.plot_widget = pg.PlotWidget()
-        self.main_layout.addWidget(self.plot_widget)
-
-        self.waveform_plot = self.plot_widget.plot(pen="w")
-        self.playhead_line = pg.InfiniteLine(pos=0, angle=90, pen='y')
-        self.plot_widget.addItem(self.playhead_line)
+        self.waveform_container = QWidget()
+        self.waveform_layout = QVBoxLayout()
+        self.waveform_layout.setContentsMargins(0, 0, 0, 0)
+        self.waveform_container.setLayout(self.waveform_layout)
+        self.main_layout.addWidget(self.waveform_container, 1)
+        self.plot_widget = None
         self.key_points = []
 
         font = QFont("Arial", 12)
@@ -121,6 +153,18 @@ class AudioEditorUI(QMainWindow):
         self.export_button.clicked.connect(self.export_audio)
         self.control_layout.addWidget(self.export_button, 0, 4)
 
+        self.save_project_button = QPushButton('Save Project')
+        self.save_project_button.setFont(font)
+        self.save_project_button.setIcon(QIcon("icons/save.png"))
+        self.save_project_button.clicked.connect(self.save_project)
+        self.control_layout.addWidget(self.save_project_button, 0, 5)
+
+        self.open_project_button = QPushButton('Open Project')
+        self.open_project_button.setFont(font)
+        self.open_project_button.setIcon(QIcon("icons/open.png"))
+        self.open_project_button.clicked.connect(self.open_project)
+        self.control_layout.addWidget(self.open_project_button, 0, 6)
+
         self.volume_slider = QSlider(Qt.Horizontal)
         self.volume_slider.setRange(-30, 30)
         self.volume_slider.setValue(0)
@@ -182,12 +226,61 @@ class AudioEditorUI(QMainWindow):
         self.pitch_down_button.clicked.connect(self.pitch_down)
         self.control_layout.addWidget(self.pitch_down_button, 4, 1)
 
-        self.plot_widget.scene().sigMouseClicked.connect(self.add_key_point)
+        self.trim_silence_button = QPushButton('Trim Silence')
+        self.trim_silence_button.setFont(font)
+        self.trim_silence_button.setIcon(QIcon("icons/trim.png"))
+        self.trim_silence_button.clicked.connect(self.trim_silence)
+        self.control_layout.addWidget(self.trim_silence_button, 4, 2)
+
+        self.split_silence_button = QPushButton('Split on Silence')
+        self.split_silence_button.setFont(font)
+        self.split_silence_button.setIcon(QIcon("icons/split.png"))
+        self.split_silence_button.clicked.connect(self.split_on_silence)
+        self.control_layout.addWidget(self.split_silence_button, 4, 3)
+
+        self.high_pass_button = QPushButton('High Pass')
+        self.high_pass_button.setFont(font)
+        self.high_pass_button.setIcon(QIcon("icons/high_pass.png"))
+        self.high_pass_button.clicked.connect(self.high_pass)
+        self.control_layout.addWidget(self.high_pass_button, 5, 0)
+
+        self.low_pass_button = QPushButton('Low Pass')
+        self.low_pass_button.setFont(font)
+        self.low_pass_button.setIcon(QIcon("icons/low_pass.png"))
+        self.low_pass_button.clicked.connect(self.low_pass)
+        self.control_layout.addWidget(self.low_pass_button, 5, 1)
+
+        self.find_loop_button = QPushButton('Find Loop Points')
+        self.find_loop_button.setFont(font)
+        self.find_loop_button.setIcon(QIcon("icons/loop.png"))
+        self.find_loop_button.clicked.connect(self.find_loop_points)
+        self.control_layout.addWidget(self.find_loop_button, 5, 2)
+
+        self.render_loop_button = QPushButton('Render Loop')
+        self.render_loop_button.setFont(font)
+        self.render_loop_button.setIcon(QIcon("icons/loop.png"))
+        self.render_loop_button.clicked.connect(self.render_loop)
+        self.control_layout.addWidget(self.render_loop_button, 5, 3)
+
+        self.pan_left_button = QPushButton('Pan Left')
+        self.pan_left_button.setFont(font)
+        self.pan_left_button.setIcon(QIcon("icons/pan.png"))
+        self.pan_left_button.clicked.connect(self.pan_left)
+        self.control_layout.addWidget(self.pan_left_button, 6, 0)
+
+        self.pan_right_button = QPushButton('Pan Right')
+        self.pan_right_button.setFont(font)
+        self.pan_right_button.setIcon(QIcon("icons/pan.png"))
+        self.pan_right_button.clicked.connect(self.pan_right)
+        self.control_layout.addWidget(self.pan_right_button, 6, 1)
+
+        self.widen_button = QPushButton('Widen Stereo')
+        self.widen_button.setFont(font)
+        self.widen_button.setIcon(QIcon("icons/pan.png"))
+        self.widen_button.clicked.connect(self.widen_stereo)
+        self.control_layout.addWidget(self.widen_button, 6, 2)
 
     def setup_mixer_tab(self):
-        self.mixer_tab = QWidget()
-        self.tab_widget.addTab(self.mixer_tab, "Mixer")
-
         self.mixer_layout = QVBoxLayout()
         self.mixer_tab.setLayout(self.mixer_layout)
 
@@ -198,22 +291,54 @@ class AudioEditorUI(QMainWindow):
         self.mix_button.clicked.connect(self.mix_audio)
         self.mixer_layout.addWidget(self.mix_button)
 
+        self.sequence_button = QPushButton('Build Sequence')
+        self.sequence_button.setFont(font)
+        self.sequence_button.setIcon(QIcon("icons/mix.png"))
+        self.sequence_button.clicked.connect(self.assemble_sequence)
+        self.mixer_layout.addWidget(self.sequence_button)
+
         self.add_audio_button = QPushButton('Add Audio File')
         self.add_audio_button.setFont(font)
         self.add_audio_button.setIcon(QIcon("icons/add.png"))
         self.add_audio_button.clicked.connect(self.add_audio_file)
         self.mixer_layout.addWidget(self.add_audio_button)
 
+        self.import_files_button = QPushButton('Import Files')
+        self.import_files_button.setFont(font)
+        self.import_files_button.setIcon(QIcon("icons/add.png"))
+        self.import_files_button.clicked.connect(self.import_files)
+        self.mixer_layout.addWidget(self.import_files_button)
+
+        self.import_folder_button = QPushButton('Import Folder')
+        self.import_folder_button.setFont(font)
+        self.import_folder_button.setIcon(QIcon("icons/folder.png"))
+        self.import_folder_button.clicked.connect(self.import_folder)
+        self.mixer_layout.addWidget(self.import_folder_button)
+
+        self.import_progress = QProgressBar(self)
+        self.import_progress.setFormat("Imported %v of %m files")
+        self.import_progress.hide()
+        self.mixer_layout.addWidget(self.import_progress)
+
         self.mix_select1 = QComboBox(self)
         self.mixer_layout.addWidget(self.mix_select1)
 
         self.mix_select2 = QComboBox(self)
         self.mixer_layout.addWidget(self.mix_select2)
 
-    def setup_history_tab(self):
-        self.history_tab = QWidget()
-        self.tab_widget.addTab(self.history_tab, "History")
+        self.browse_library_button = QPushButton('Browse Sound Library')
+        self.browse_library_button.setFont(font)
+        self.browse_library_button.setIcon(QIcon("icons/folder.png"))
+        self.browse_library_button.clicked.connect(self.browse_library)
+        self.mixer_layout.addWidget(self.browse_library_button)
 
+        self.library_list = QListWidget(self)
+        self.library_list.setIconSize(QSize(128, 32))
+        self.library_list.setUniformItemSizes(True)
+        self.library_list.itemActivated.connect(self.open_library_item)
+        self.mixer_layout.addWidget(self.library_list)
+
+    def setup_history_tab(self):
         self.history_layout = QVBoxLayout()
         self.history_tab.setLayout(self.history_layout)
 
@@ -234,9 +359,6 @@ class AudioEditorUI(QMainWindow):
         self.history_layout.addWidget(self.history_list)
 
     def setup_sound_banks_tab(self):
-        self.sound_banks_tab = QWidget()
-        self.tab_widget.addTab(self.sound_banks_tab, "Sound Banks")
-
         self.sound_banks_layout = QVBoxLayout()
         self.sound_banks_tab.setLayout(self.sound_banks_layout)
 
@@ -300,6 +422,21 @@ class AudioEditorUI(QMainWindow):
         self.export_custom_audio_button.clicked.connect(self.export_custom_audio)
         self.sound_banks_layout.addWidget(self.export_custom_audio_button)
 
+        self.export_sound_bank_button = QPushButton('Export Sound Bank')
+        self.export_sound_bank_button.setFont(font)
+        self.export_sound_bank_button.setIcon(QIcon("icons/export.png"))
+        self.export_sound_bank_button.clicked.connect(self.export_sound_bank)
+        self.sound_banks_layout.addWidget(self.export_sound_bank_button)
+
+        self.find_similar_button = QPushButton('Find Similar Sounds')
+        self.find_similar_button.setFont(font)
+        self.find_similar_button.setIcon(QIcon("icons/search.png"))
+        self.find_similar_button.clicked.connect(self.find_similar)
+        self.sound_banks_layout.addWidget(self.find_similar_button)
+
+        self.similar_list = QListWidget(self)
+        self.sound_banks_layout.addWidget(self.similar_list)
+
     def show_error_message(self, message):
         msg = QMessageBox()
         msg.setIcon(QMessageBox.Critical)
@@ -311,6 +448,12 @@ class AudioEditorUI(QMainWindow):
     def open_file(self):
         pass
 
+    def save_project(self):
+        pass
+
+    def open_project(self):
+        pass
+
     def play_audio(self):
         pass
 
@@ -326,12 +469,21 @@ class AudioEditorUI(QMainWindow):
     def export_custom_audio(self):
         pass
 
+    def export_sound_bank(self):
+        pass
+
     def adjust_volume(self):
         pass
 
     def trim_audio(self):
         pass
 
+    def trim_silence(self):
+        pass
+
+    def split_on_silence(self):
+        pass
+
     def fade_in(self):
         pass
 
@@ -344,6 +496,27 @@ class AudioEditorUI(QMainWindow):
     def add_reverb(self):
         pass
 
+    def high_pass(self):
+        pass
+
+    def low_pass(self):
+        pass
+
+    def find_loop_points(self):
+        pass
+
+    def render_loop(self):
+        pass
+
+    def pan_left(self):
+        pass
+
+    def pan_right(self):
+        pass
+
+    def widen_stereo(self):
+        pass
+
     def pitch_up(self):
         pass
 
@@ -368,12 +541,30 @@ class AudioEditorUI(QMainWindow):
     def generate_random_audio(self):
         pass
 
+    def find_similar(self):
+        pass
+
     def mix_audio(self):
         pass
 
+    def assemble_sequence(self):
+        pass
+
     def add_audio_file(self):
         pass
 
+    def import_files(self):
+        pass
+
+    def import_folder(self):
+        pass
+
+    def browse_library(self):
+        pass
+
+    def open_library_item(self, item):
+        pass
+
     def add_key_point(self, event):
         pos = event.scenePos()
         if self.plot_widget.plotItem.sceneBoundingRect().contains(pos):
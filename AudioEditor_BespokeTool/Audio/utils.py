@@ -1,7 +1,22 @@
-import pyqtgraph as pg
-
 def plot_waveform(plot_widget, audio_data, key_points):
+    import pyqtgraph as pg
     plot_widget.clear()
     plot_widget.plot(audio_data, pen='w')
     for point in key_points:
         plot_widget.addItem(pg.InfiniteLine(pos=point, angle=90, pen='r'))
+
+
+def thumbnail_icon(peaks, width=128, height=32):
+    from PyQt5.QtCore import Qt
+    from PyQt5.QtGui import QPixmap, QPainter, QColor, QIcon
+    pixmap = QPixmap(width, height)
+    pixmap.fill(Qt.transparent)
+    painter = QPainter(pixmap)
+    painter.setPen(QColor("white"))
+    middle = height / 2
+    scale = middle / 127
+    for x in range(width):
+        low, high = peaks[x * len(peaks) // width]
+        painter.drawLine(x, int(middle - high * scale), x, int(middle - low * scale))
+    painter.end()
+    return QIcon(pixmap)